@@ -18,12 +18,19 @@
 
 import numpy as np
 import pandas as pd
-from completed_projects.rajaram_dissertation.creating_variables.similarity import PhonemicSimilarity
+from completed_projects.rajaram_dissertation.creating_variables.lexicon_union import LexiconUnion
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_cache import NeighborhoodCache
+from completed_projects.rajaram_dissertation.creating_variables.network_metrics import NetworkMetrics
+from completed_projects.rajaram_dissertation.creating_variables.orthographic_neighborhood import OrthographicNeighborhood, \
+    root_spelling
+from completed_projects.rajaram_dissertation.creating_variables.phonological_distance import PhonologicalDistance
+from completed_projects.rajaram_dissertation.creating_variables.phonotactic_probability import PhonotacticProbability
 from completed_projects.rajaram_dissertation.creating_variables.similarity import SONSimilarity
-from completed_projects.rajaram_dissertation.creating_variables.syllabifier import Syllabifier
+from completed_projects.rajaram_dissertation.creating_variables.syllabifier import SyllableCache
 from completed_projects.rajaram_dissertation.creating_variables.proxy_acq_conv_trscr import ProxyAcqConvTrscr
 from completed_projects.rajaram_dissertation.transcript_processing.create_lexicons import CreateLexicons
 from completed_projects.rajaram_dissertation.locations import Locations
+from completed_projects.rajaram_dissertation.resource_registry import ResourceRegistry
 
 class CreateVariables:
     """ Only class in module; see header for complete documentation """
@@ -32,7 +39,8 @@ class CreateVariables:
 
         # project specific file locations and variable names
         self.l = Locations()
-        self.findShape = Syllabifier('STRESS')
+        # cv shape, syllable count, boundaries and spans, shared with SONSimilarity
+        self.syllable_cache = SyllableCache()
         self.sim = SONSimilarity(list())
         self.fau = ProxyAcqConvTrscr()
 
@@ -61,6 +69,35 @@ class CreateVariables:
         self.son_frequency = 'SON_frequency'
         self.sad_frequency_pct_raw = 'SAD_frequency_pct_child_raw'
 
+        # PHON network measures, see network_metrics
+        self.sad_clustering = 'SAD_clustering'
+        self.sad_two_hop = 'SAD_two_hop'
+        self.sad_component_size = 'SAD_component_size'
+        self.sad_giant_component = 'SAD_giant_component'
+        self.sad_closeness = 'SAD_closeness'
+        self.sad_k_core = 'SAD_k_core'
+        # SAD_closeness is exact with None: one breadth first search per word, about 1s for a 5000 word
+        # lexicon but about 1 min for 20000. A number makes it an estimate in components larger than that,
+        # from that many words chosen with closeness_seed, so the same seed gives the same column
+        self.closeness_samples = None
+        self.closeness_seed = 0
+
+        # PHON mean edit distance to the 20 nearest words, without stress, see phonological_distance;
+        # words that differ only in stress are 0 apart, as in SAD_density
+        self.pld20 = 'pld20'
+        # processes the word lengths of pld20 are split over; more than 1 only pays off for large lexicons
+        self.pld_jobs = 1
+
+        # ORTH neighborhood density (Coltheart's N) and frequency, see orthographic_neighborhood
+        self.orth_density = 'ORTH_density'
+        self.orth_frequency_pct_raw = 'ORTH_frequency_pct_child_raw'
+
+        # phonotactic probability against the adult lexicon, see phonotactic_probability
+        self.segment_probability = 'segment_probability'
+        self.biphone_probability = 'biphone_probability'
+        self.segment_probability_token = 'segment_probability_token'
+        self.biphone_probability_token = 'biphone_probability_token'
+
         # different ways of creating PACT values
         self.fau_pct_tok_p1 = 'fau_poly1'
         self.fau_pct_tok_p2 = 'fau_poly2'
@@ -72,48 +109,63 @@ class CreateVariables:
 
     def create_experimental_vars(self):
         lex = CreateLexicons()
+        ResourceRegistry().print_load_report()
+        runs = [(lex.child3, lex.adult3, T.l.filebase + T.l.threename),
+                (lex.child4, lex.adult4, T.l.filebase + T.l.fourname),
+                (lex.child6, lex.adult6, T.l.filebase + T.l.sixname),
+                (lex.adult3, lex.adult3, T.l.filebase + T.l.threeAdultname),
+                (lex.adult4, lex.adult4, T.l.filebase + T.l.fourAdultname),
+                (lex.adult6, lex.adult6, T.l.filebase + T.l.sixAdultname)]
+        # neighborhoods of all six lexicons come from one index over their union
+        neighborhoods = LexiconUnion(dict((filebase, child.keys()) for (child, adult, filebase) in runs),
+                                     cache=NeighborhoodCache(self.l.neighborhood_cache))
         # OME child with OME adult as frequency
         print('writing child lexicons')
-        self.serialize_experimental_vars(lex.child3, lex.adult3, T.l.filebase + T.l.threename)
-        self.serialize_experimental_vars(lex.child4, lex.adult4, T.l.filebase + T.l.fourname)
-        self.serialize_experimental_vars(lex.child6, lex.adult6, T.l.filebase + T.l.sixname)
+        for (child, adult, filebase) in runs[:3]:
+            self.serialize_experimental_vars(child, adult, filebase, neighborhoods)
         # OME ADULT (with adult frequency)
         print('writing adult lexicons')
-        self.serialize_experimental_vars(lex.adult3, lex.adult3, T.l.filebase + T.l.threeAdultname)
-        self.serialize_experimental_vars(lex.adult4, lex.adult4, T.l.filebase + T.l.fourAdultname)
-        self.serialize_experimental_vars(lex.adult6, lex.adult6, T.l.filebase + T.l.sixAdultname)
+        for (child, adult, filebase) in runs[3:]:
+            self.serialize_experimental_vars(child, adult, filebase, neighborhoods)
+        self.syllable_cache.print_stats()
         print('finished.')
 
-    def serialize_experimental_vars(self, child, adult, filebase):
+    def serialize_experimental_vars(self, child, adult, filebase, neighborhoods=None):
+        # neighborhoods: LexiconUnion that includes child under the name filebase
+        if neighborhoods is None:
+            neighborhoods = LexiconUnion({filebase: child.keys()})
 
         def find_orthographic(phon):
             return child[phon]['ORTH']
 
         def find_onset_nucleus(phon):
-            if '_' in phon:
-                trim = ""
-                for syll in phon.split('_'):
-                    if '1' in syll:
-                        trim = self.sim.trimSyllable(syll)
-                return trim
-
+            # the last stressed syllable of a polysyllable, cut from its spans
+            spans = self.syllable_cache.lookup(phon).spans
+            if len(spans.syllables) > 1:
+                if spans.stresses:
+                    return spans.trim(spans.stresses[-1])
+                return ""
+            elif spans.stresses:
+                return spans.trim(0)
             else:
-                return self.sim.trimSyllable(phon)
+                # unstressed monosyllables keep the old cut
+                return self.sim.trimSyllable(spans.word)
 
         def find_onset_nucleus_coda(phon):
-            if '_' in phon:
-                trim = ""
-                for syll in phon.split('_'):
-                    if '1' in syll:
-                        return syll
+            spans = self.syllable_cache.lookup(phon).spans
+            if len(spans.syllables) > 1:
+                if spans.stresses:
+                    return spans.syllable(spans.stressed)
+                return None
             else:
-                return phon
+                return spans.word
 
         def find_length_syllables(phon):
-            if self.findShape.number_syllables(phon) > 1:
-                return self.findShape.number_syllables(phon)
+            info = self.syllable_cache.lookup(phon)
+            if info.syllables > 1:
+                return info.syllables
             else:
-                if self.findShape.CVshape(phon) == 'cv1c':
+                if info.cv == 'cv1c':
                     return 0
                 return 1
 
@@ -123,11 +175,10 @@ class CreateVariables:
             return len(nounder)
 
         def find_stressed_syllable(phon):
-            pieces = phon.split("_")
-            for pos in range(0, len(pieces)):
-                if "1" in pieces[pos]:
-                    return pos + 1
-            print(phon, 'no stress')
+            info = self.syllable_cache.lookup(phon)
+            if info.spans.stresses:
+                return info.spans.stressed + 1
+            print(info.boundaries, 'no stress')
             return -1
 
         def find_log_pct_child(phon):
@@ -149,37 +200,10 @@ class CreateVariables:
                 return np.nan
 
         def find_syllable_representation(phon):
-            return child_SON_sim.phon2syll[phon]
+            return self.syllable_cache.lookup(phon).boundaries
 
         def find_child_SON_density(phon):
-            return len(child_SON[phon])
-
-        def find_child_PHON_density(phon):
-            return len(current_all_sim[phon])
-
-        def find_adult_PHON_frequency_pct_raw(phon):
-
-            # averag adult PCT frequency of SAD similar words
-            freqsum = 0
-            if phon in current_all_sim:
-                if len(current_all_sim[phon]) >= 1:
-                    neighbors = current_all_sim[phon]
-                    for neighbor in neighbors:
-                        if neighbor in adult:
-                            freqsum += adult[neighbor]['NUMCHILD']
-                    return float(freqsum) / len(neighbors)
-                else:
-                    return freqsum # no neighbors
-            else:
-                return np.nan # not in dict
-
-        def find_adult_SON_density(phon):
-
-            # average log adult token frequency of SON similar words
-            if phon in current_all_sim:
-                return len(current_all_sim[phon])
-            else:
-                return 0
+            return child_SON[phon]
 
         def adjusted_use(ause,cuse,poly):
             blank = np.zeros(len(vars))
@@ -199,24 +223,46 @@ class CreateVariables:
         vars[self.token_adult] = vars.phonological.apply(find_log_adult_token)
         # relating to word characteristics
         vars[self.syllables] = vars.phonological.apply(find_syllable_representation)
-        vars[self.length_syllables] = vars.syllables.apply(find_length_syllables)
+        vars[self.length_syllables] = vars.phonological.apply(find_length_syllables)
         vars[self.length_phonemes] = vars.phonological.apply(find_length_phonemes)
-        vars[self.str_pos] = vars.syllables.apply(find_stressed_syllable)
-        vars[self.onset_nucleus] = vars.syllables.apply(find_onset_nucleus)
-        vars[self.onset_nucleus_coda] = vars.syllables.apply(find_onset_nucleus_coda)
+        vars[self.str_pos] = vars.phonological.apply(find_stressed_syllable)
+        vars[self.onset_nucleus] = vars.phonological.apply(find_onset_nucleus)
+        vars[self.onset_nucleus_coda] = vars.phonological.apply(find_onset_nucleus_coda)
         # creating stressed syllable based similarity metrics
-        child_SON_sim = SONSimilarity(child.keys())
-        child_SON = child_SON_sim.stress_onset_nucleus_similarity_word(simtype='onset-nucleus')
+        child_SON_densities = neighborhoods.son_densities(filebase)
+        child_SON = child_SON_densities['onset-nucleus']
         vars[self.onset_nucleus_density] = vars.phonological.apply(find_child_SON_density)
-        child_SON_sim = SONSimilarity(child.keys())
-        child_SON = child_SON_sim.stress_onset_nucleus_similarity_word(simtype='onset-nucleus-coda')
+        child_SON = child_SON_densities['onset-nucleus-coda']
         vars[self.onset_nucleus_coda_density] = vars.phonological.apply(find_child_SON_density)
 
-        child_SAD_sim = PhonemicSimilarity(child.keys())
-        current_all_sim = child_SAD_sim.findPhonemicSimilarity(child.keys(), True)
-        vars[self.phon_n_density] = vars.phonological.apply(find_child_PHON_density)
-        # PHON neighborhood frequency variable
-        vars[self.sad_frequency_pct_raw] = vars.phonological.apply(find_adult_PHON_frequency_pct_raw)
+        vars[self.phon_n_density] = neighborhoods.phonemic_densities()[filebase]
+        # PHON neighborhood frequency variable: average adult PCT frequency of SAD similar words
+        child_SAD_graph = neighborhoods.graph(filebase)
+        adult_pct = child_SAD_graph.frequency_vector(adult, 'NUMCHILD')
+        SAD_frequency = child_SAD_graph.neighborhood_frequency({'pct_adult': adult_pct})
+        vars[self.sad_frequency_pct_raw] = SAD_frequency['pct_adult']['mean'][neighborhoods.word_ids(vars.phonological)]
+        # PHON network measures, over this lexicon's words only (the graph spans every lexicon of the union)
+        SAD_network = NetworkMetrics(child_SAD_graph.subgraph(vars.phonological)).all(self.closeness_samples, self.closeness_seed)
+        vars[self.sad_clustering] = SAD_network['clustering']
+        vars[self.sad_two_hop] = SAD_network['two_hop']
+        vars[self.sad_component_size] = SAD_network['component_size']
+        vars[self.sad_giant_component] = SAD_network['giant_component']
+        vars[self.sad_closeness] = SAD_network['closeness']
+        vars[self.sad_k_core] = SAD_network['k_core']
+        vars[self.pld20] = PhonologicalDistance(vars.phonological, jobs=self.pld_jobs).pld(20)
+        # ORTH neighborhood density and frequency: average adult PCT frequency of orthographic neighbors
+        orth = OrthographicNeighborhood(vars.phonological, vars.orthographic.apply(root_spelling))
+        vars[self.orth_density] = orth.densities()
+        child_ORTH_graph = orth.graph()
+        adult_pct = child_ORTH_graph.frequency_vector(adult, 'NUMCHILD')
+        vars[self.orth_frequency_pct_raw] = child_ORTH_graph.neighborhood_frequency({'pct_adult': adult_pct})['pct_adult']['mean']
+        # phonotactic probability: positional segment and biphone sums, by adult words and by log adult tokens
+        phonotactics = PhonotacticProbability(adult.keys())
+        vars[self.segment_probability] = phonotactics.segment(vars.phonological)
+        vars[self.biphone_probability] = phonotactics.biphone(vars.phonological)
+        phonotactics = PhonotacticProbability(adult.keys(), np.log1p([adult[phon]['TOKEN'] for phon in adult]))
+        vars[self.segment_probability_token] = phonotactics.segment(vars.phonological)
+        vars[self.biphone_probability_token] = phonotactics.biphone(vars.phonological)
 
         # various versions of PACT with pct/token, token/token, pct/pct
         mask = np.isfinite(vars[self.token_adult])
@@ -0,0 +1,186 @@
+""" Finds the words of a lexicon within any edit distance of a form
+
+    NeighborhoodIndex only finds words one edit apart. PhonemeTrie stores
+    the Klattese forms of a lexicon in a trie (one phoneme per branch) and
+    walks it with one row of the Levenshtein table per node: the row of a
+    node extends its parent's row by one phoneme, so words sharing a prefix
+    share its rows. A branch is dropped as soon as the smallest entry of its
+    row is over the limit, since no word below it can come back under.
+
+        within: every word no more than k edits from the form
+        nearest: the count words closest to the form, walking the closest
+                 branches first and dropping any branch that cannot beat the
+                 count-th best word found so far; of words tied at the last
+                 distance, those first in the lexicon are kept
+
+    Substitutions cost 1 unless weighted, insertions and deletions cost
+    indel. Weights must not be negative; a substitution missing from
+    weights costs 1.
+
+    Examples:
+
+        trie = PhonemeTrie(words, stress=True)
+        trie.within('kat', 2)
+            dict[word] = edit distance, for the words at most 2 edits from kat
+
+        trie.nearest('kat', 20, exclude='kat')
+            [(word, distance)] of the 20 closest words other than kat,
+            closest first
+
+        trie = PhonemeTrie(words, weights={('p', 'b'): 0.5, ('t', 'd'): 0.5})
+            Voicing substitutions count half an edit; weights apply in
+            either direction.
+
+        trie.neighbors(2)
+            dict[word] = dict[neighbor] = distance, for every word
+
+    NOTE: with k=1 and no weights, within also counts substitutions in
+    one-phoneme words, which NeighborhoodIndex has never counted.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - new, used for PLD-style measures
+
+"""
+import heapq
+
+
+class PhonemeTrie():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, words, stress=True, weights=None, indel=1):
+        # words are kept once each, in the order given
+        self.words = list(dict.fromkeys(words))
+        self.stress = stress
+        self.indel = indel
+        self.weights = dict()
+        if weights is not None:
+            for (first, second), cost in weights.items():
+                if cost < 0:
+                    print('substitution weights cannot be negative:', first, second, cost)
+                    print('PhonemeTrie')
+                    quit()
+                self.weights[(first, second)] = cost
+                self.weights[(second, first)] = cost
+        # children[node] = dict[phoneme] = child node; ends[node] = ids of the words ending there;
+        # first[node] = smallest id of the words below the node
+        self.children = [dict()]
+        self.ends = [list()]
+        self.first = [0]
+        for wordID, word in enumerate(self.words):
+            self.insert(wordID, self.form(word))
+        self.alphabet = set(phoneme for children in self.children for phoneme in children)
+
+    def form(self, word):
+        if self.stress:
+            return word
+        return word.replace("1", "")
+
+    def insert(self, wordID, form):
+        node = 0
+        for phoneme in form:
+            child = self.children[node].get(phoneme)
+            if child is None:
+                child = len(self.children)
+                self.children[node][phoneme] = child
+                self.children.append(dict())
+                self.ends.append(list())
+                # words are inserted in id order, so the first one through a node has the smallest id
+                self.first.append(wordID)
+            node = child
+        self.ends[node].append(wordID)
+
+    def costs(self, form):
+        # dict[phoneme] = substitution cost of the phoneme for each phoneme of form
+        costs = dict()
+        for phoneme in self.alphabet:
+            costs[phoneme] = [0 if phoneme == other else self.weights.get((phoneme, other), 1) for other in form]
+        return costs
+
+    def step(self, row, phoneme, costs):
+        # Levenshtein row one phoneme further down the trie
+        indel = self.indel
+        left = row[0] + indel
+        nextRow = [left]
+        for above, diagonal, cost in zip(row[1:], row, costs[phoneme]):
+            left = left + indel
+            if above + indel < left:
+                left = above + indel
+            if diagonal + cost < left:
+                left = diagonal + cost
+            nextRow.append(left)
+        return nextRow
+
+    def within(self, word, k):
+        """
+
+        :param word: form to search around; need not be in the lexicon
+        :param k: largest edit distance
+        :return: dict[word] = edit distance, for every word within k, in lexicon order
+        """
+        form = self.form(word)
+        costs = self.costs(form)
+        found = list()
+        stack = [(0, [position * self.indel for position in range(len(form) + 1)])]
+        while stack:
+            (node, row) = stack.pop()
+            if row[-1] <= k:
+                found.extend((wordID, row[-1]) for wordID in self.ends[node])
+            for phoneme, child in self.children[node].items():
+                nextRow = self.step(row, phoneme, costs)
+                if min(nextRow) <= k:
+                    stack.append((child, nextRow))
+        found.sort()
+        return dict((self.words[wordID], distance) for wordID, distance in found)
+
+    def nearest(self, word, count, exclude=None):
+        """
+
+        :param word: form to search around; need not be in the lexicon
+        :param count: number of words to return
+        :param exclude: word left out of the results, usually word itself
+        :return: list of (word, distance) of the count closest words, closest
+                 first, in lexicon order within a distance; of several words
+                 tied at the last distance, those first in the lexicon are kept
+        """
+        form = self.form(word)
+        costs = self.costs(form)
+        # best holds (-distance, -word id) of the count closest so far, worst (farthest, then last) on top
+        best = list()
+        start = [position * self.indel for position in range(len(form) + 1)]
+        queue = [(0, 0, 0, start)]
+        order = 1
+        while queue:
+            (bound, tie, node, row) = heapq.heappop(queue)
+            if len(best) == count and bound > -best[0][0]:
+                break
+            if len(best) == count and not self.can_beat(bound, node, best[0]):
+                continue
+            for wordID in self.ends[node]:
+                if self.words[wordID] == exclude:
+                    continue
+                entry = (-row[-1], -wordID)
+                if len(best) < count:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+            for phoneme, child in self.children[node].items():
+                nextRow = self.step(row, phoneme, costs)
+                lowest = min(nextRow)
+                if len(best) < count or self.can_beat(lowest, child, best[0]):
+                    heapq.heappush(queue, (lowest, order, child, nextRow))
+                    order += 1
+        best.sort(reverse=True)
+        return [(self.words[-wordID], -distance) for distance, wordID in best]
+
+    def can_beat(self, lowest, node, worst):
+        # whether a word below node, at lowest or more, can take the place of the worst (-distance, -word id)
+        return lowest < -worst[0] or (lowest == -worst[0] and self.first[node] < -worst[1])
+
+    def neighbors(self, k=1):
+        # dict[word] = dict[neighbor] = distance, for the other words within k of each word
+        neighbors = dict()
+        for word in self.words:
+            found = self.within(word, k)
+            found.pop(word, None)
+            neighbors[word] = found
+        return neighbors
@@ -0,0 +1,281 @@
+""" Finds one-edit neighbor pairs on disk, for vocabularies too large for memory
+
+    The same hashes and checks as NeighborhoodIndex (see neighborhood_index),
+    but no step holds more than a memory budget of them at once:
+
+        1. The words are streamed in chunks. Each chunk's word hashes and
+           deletion hashes are sorted and written to disk as runs, and its
+           phoneme codes are appended to one file per form set.
+        2. The runs are merged in key order, a block at a time. Every block
+           ends on a key boundary, so each group of equal keys is seen
+           whole, and is joined into candidate pairs exactly as in memory.
+        3. Each block of candidates is checked phoneme by phoneme on codes
+           read back from the code files, and the neighbor pairs are
+           written as sorted runs of their own.
+        4. The pair runs are merged, dropping pairs found more than once,
+           into the final left and right arrays.
+
+    The pairs are the same, in the same sorted order, as find_pairs gives.
+
+    Examples:
+
+        build = ExternalBuild(memory=2 ** 28, directory='/scratch/neighborhoods')
+        [(left, right)] = build.pairs([forms])
+            Arrays of the word ids (positions in forms) of every neighbor
+            pair, left < right; forms can be any iterable, e.g. a generator
+            over a word list file.
+
+        NeighborhoodIndex(words, external=ExternalBuild())
+        StressNeighborhoods(words, external=ExternalBuild())
+            The in-memory engines, with their pairs built on disk.
+
+    NOTE: every file is written in a new subdirectory of directory (default:
+    the system temp directory), which is removed when pairs returns, also on
+    an error. Only the candidates are kept under the budget: the pairs
+    themselves are returned in memory (16 bytes a pair), and NeighborhoodIndex
+    and StressNeighborhoods still hold every word and form as Python strings,
+    so they need memory in proportion to the vocabulary; use the pairs of
+    build.pairs directly, on a generator of forms, to avoid that. To keep the
+    pairs on disk between runs, pass a NeighborhoodCache as well.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by NeighborhoodIndex and StressNeighborhoods when given
+            - gives the same pairs as find_pairs
+
+"""
+import os
+import tempfile
+
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import VERIFY_BLOCK, PhonemeCodes, \
+    group_pairs, join_pairs, salt, verify_codes
+
+# default memory budget, in bytes
+DEFAULT_MEMORY = 2 ** 28
+# bytes allowed per key record (key and word id), for their copies while sorting and joining
+RECORD_BYTES = 64
+# fewest records read from a run at once
+MERGE_BLOCK = 2 ** 10
+
+
+class ExternalBuild():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, memory=DEFAULT_MEMORY, directory=None):
+        self.memory = memory
+        self.directory = directory
+        # key records held at once
+        self.records = max(memory // RECORD_BYTES, MERGE_BLOCK)
+
+    def pairs(self, formSets):
+        """
+
+        :param formSets: iterables of forms of the same words, as for find_pairs
+        :return: list with the (left, right) word ids of the pairs in each
+                 form set
+        """
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="neighborhoods_", dir=self.directory) as work:
+            self.work = work
+            try:
+                return self.build(formSets)
+            finally:
+                (self.lengths, self.flat, self.starts) = (None, None, None)
+
+    def build(self, formSets):
+        # pairs of each form set, with every file in self.work
+        self.sets = len(formSets)
+        (self.size, wordRuns, deletionRuns) = self.write_runs(formSets)
+
+        self.lengths = [load(self.path("lengths", formSet)) for formSet in range(self.sets)]
+        self.flat = [load(self.path("flat", formSet)) for formSet in range(self.sets)]
+        self.starts = [np.concatenate(([0], np.cumsum(lengths))) for lengths in self.lengths]
+        self.pairRuns = [list() for formSet in range(self.sets)]
+        self.buffers = [list() for formSet in range(self.sets)]
+
+        # same phonemes, and additions and deletions: word hashes (tag 0) against deletion hashes (tag 1)
+        for (keys, ids, tags) in merge_runs([(run, 0) for run in wordRuns] + [(run, 1) for run in deletionRuns],
+                                            self.block(len(wordRuns) + len(deletionRuns))):
+            (words, deletions) = (tags == 0, tags == 1)
+            self.add_candidates(group_pairs(keys[words], ids[words]))
+            self.add_candidates(join_pairs(keys[deletions], ids[deletions], keys[words], ids[words]))
+        # substitutions: deletion hashes salted by position
+        saltedRuns = [(self.salted(run, number), 0) for number, run in enumerate(deletionRuns)]
+        for (keys, ids, tags) in merge_runs(saltedRuns, self.block(len(saltedRuns))):
+            self.add_candidates(group_pairs(keys, ids))
+
+        results = list()
+        for formSet in range(self.sets):
+            self.flush(formSet)
+            results.append(self.merge_pairs(formSet))
+        return results
+
+    def path(self, name, number):
+        return os.path.join(self.work, name + "_" + str(number) + ".npy")
+
+    def block(self, runs):
+        # records read from each of several runs at once
+        return max(self.records // max(runs, 1), MERGE_BLOCK)
+
+    def write_runs(self, formSets):
+        # streams the words in chunks; returns (number of words, word hash runs, deletion hash runs)
+        # as in verified_pairs, another form set can need the deletions of one-phoneme words
+        minimum = 2 if self.sets == 1 else 1
+        codeFiles = list()
+        for formSet in range(self.sets):
+            codeFiles.append((open(self.path("flat", formSet) + ".raw", "wb"),
+                              open(self.path("lengths", formSet) + ".raw", "wb")))
+        (wordRuns, deletionRuns) = (list(), list())
+        (size, chunk, records) = (0, list(), 0)
+        for forms in zip(*formSets):
+            chunk.append(forms)
+            records += 2 * len(forms[0]) + 1
+            if records >= self.records:
+                self.write_chunk(chunk, size, minimum, codeFiles, wordRuns, deletionRuns)
+                size += len(chunk)
+                (chunk, records) = (list(), 0)
+        if chunk:
+            self.write_chunk(chunk, size, minimum, codeFiles, wordRuns, deletionRuns)
+            size += len(chunk)
+        for formSet, (flatFile, lengthFile) in enumerate(codeFiles):
+            flatFile.close()
+            lengthFile.close()
+            save_raw(self.path("flat", formSet), np.uint32)
+            save_raw(self.path("lengths", formSet), np.int64)
+        return (size, wordRuns, deletionRuns)
+
+    def write_chunk(self, chunk, offset, minimum, codeFiles, wordRuns, deletionRuns):
+        for formSet, (flatFile, lengthFile) in enumerate(codeFiles):
+            codes = PhonemeCodes([forms[formSet] for forms in chunk], raw=True)
+            codes.flat.astype(np.uint32).tofile(flatFile)
+            codes.lengths.tofile(lengthFile)
+            if formSet == 0:
+                (full, wordIDs, positions, deleted) = codes.hashes(minimum)
+                everyone = np.arange(len(chunk), dtype=np.int64)
+                wordRuns.append(self.write_run("words", len(wordRuns), full, everyone + offset))
+                deletionRuns.append(self.write_run("deletions", len(deletionRuns), deleted, wordIDs + offset,
+                                                   positions))
+
+    def write_run(self, name, number, keys, ids, positions=None):
+        # saves the records sorted by key; returns the paths of the run's arrays
+        order = np.argsort(keys, kind="stable")
+        paths = [self.path(name + "_keys", number), self.path(name + "_ids", number)]
+        np.save(paths[0], keys[order])
+        np.save(paths[1], ids[order])
+        if positions is not None:
+            paths.append(self.path(name + "_positions", number))
+            np.save(paths[2], positions[order])
+        return paths
+
+    def salted(self, run, number):
+        # run of the deletion hashes salted by position, which changes their order
+        (keys, ids, positions) = [load(path) for path in run]
+        return self.write_run("salted", number, salt(np.asarray(keys), np.asarray(positions)), np.asarray(ids))
+
+    def add_candidates(self, candidates):
+        (left, right) = candidates
+        (left, right) = (np.minimum(left, right), np.maximum(left, right))
+        keep = left != right
+        (left, right) = (left[keep], right[keep])
+        for start in range(0, len(left), VERIFY_BLOCK):
+            block = slice(start, start + VERIFY_BLOCK)
+            self.verify(left[block], right[block])
+
+    def verify(self, left, right):
+        # checks the candidates against each form set, and buffers the pairs that are neighbors
+        ids = np.unique(np.concatenate((left, right)))
+        (leftRows, rightRows) = (np.searchsorted(ids, left), np.searchsorted(ids, right))
+        for formSet in range(self.sets):
+            (codes, lengths) = self.read_codes(formSet, ids)
+            keep = verify_codes(codes, lengths, leftRows, rightRows)
+            self.buffers[formSet].append(left[keep] * self.size + right[keep])
+            if sum(len(keys) for keys in self.buffers[formSet]) >= self.records:
+                self.flush(formSet)
+
+    def read_codes(self, formSet, ids):
+        # (phoneme codes padded with 0, lengths) of the words ids, from the code files
+        lengths = np.asarray(self.lengths[formSet][ids])
+        codes = np.zeros((len(ids), int(lengths.max(initial=0)) + 1), dtype=np.uint32)
+        rows = np.repeat(np.arange(len(ids)), lengths)
+        columns = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        codes[rows, columns] = self.flat[formSet][self.starts[formSet][ids][rows] + columns]
+        return (codes, lengths)
+
+    def flush(self, formSet):
+        # writes the buffered pairs of a form set as one sorted run
+        keys = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + self.buffers[formSet]))
+        self.buffers[formSet] = list()
+        if len(keys):
+            path = self.path("found_" + str(formSet), len(self.pairRuns[formSet]))
+            np.save(path, keys)
+            self.pairRuns[formSet].append([path, path])
+
+    def merge_pairs(self, formSet):
+        # (left, right) in memory, from the pair runs of a form set
+        paths = [os.path.join(self.work, "pairs_" + str(formSet) + "_" + side + ".npy") for side in ("left", "right")]
+        (leftFile, rightFile) = (open(paths[0] + ".raw", "wb"), open(paths[1] + ".raw", "wb"))
+        runs = [(run, 0) for run in self.pairRuns[formSet]]
+        for (keys, ids, tags) in merge_runs(runs, self.block(len(runs))):
+            unique = np.unique(keys)
+            (unique // self.size).tofile(leftFile)
+            (unique % self.size).tofile(rightFile)
+        leftFile.close()
+        rightFile.close()
+        return tuple(np.array(save_raw(path, np.int64)) for path in paths)
+
+
+def merge_runs(runs, block):
+    """ Merges sorted runs a block at a time, without splitting any key.
+
+    :param runs: list of ([keys path, ids path, ...], tag)
+    :param block: records read from each run at once
+    :return: generator of (keys, ids, tags) numpy arrays, sorted by key;
+             all the records of a key are in the same block
+    """
+    arrays = [(load(paths[0]), load(paths[1]), tag) for (paths, tag) in runs]
+    positions = [0] * len(arrays)
+    sizes = [block] * len(arrays)
+    while True:
+        live = [run for run in range(len(arrays)) if positions[run] < len(arrays[run][0])]
+        if not live:
+            return
+        ends = dict((run, min(positions[run] + sizes[run], len(arrays[run][0]))) for run in live)
+        unfinished = [run for run in live if ends[run] < len(arrays[run][0])]
+        # nothing at or past the smallest last key read can be taken: more of it may follow in its run
+        if unfinished:
+            bound = min(arrays[run][0][ends[run] - 1] for run in unfinished)
+        (keys, ids, tags) = (list(), list(), list())
+        for run in live:
+            runKeys = np.asarray(arrays[run][0][positions[run]:ends[run]])
+            if unfinished:
+                cut = int(np.searchsorted(runKeys, bound, side="left"))
+            else:
+                cut = len(runKeys)
+            keys.append(runKeys[:cut])
+            ids.append(np.asarray(arrays[run][1][positions[run]:positions[run] + cut]))
+            tags.append(np.full(cut, arrays[run][2], dtype=np.int8))
+            positions[run] += cut
+        if sum(len(runKeys) for runKeys in keys) == 0:
+            # a whole block of one key: read more of the runs stuck on it
+            for run in unfinished:
+                if arrays[run][0][positions[run]] == bound:
+                    sizes[run] *= 2
+            continue
+        sizes = [block] * len(arrays)
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind="stable")
+        yield (keys[order], np.concatenate(ids)[order], np.concatenate(tags)[order])
+
+
+def load(path):
+    return np.load(path, mmap_mode="r")
+
+
+def save_raw(path, dtype):
+    # turns the raw file path + '.raw' into the .npy file path, memory-mapped
+    raw = np.memmap(path + ".raw", dtype=dtype, mode="r") if os.path.getsize(path + ".raw") else np.zeros(0, dtype=dtype)
+    np.save(path, raw)
+    del raw
+    os.remove(path + ".raw")
+    return load(path)
@@ -0,0 +1,198 @@
+""" Neighborhoods of several overlapping lexicons from one index
+
+    The child and adult lexicons share most of their words, so instead of
+    building a PhonemicSimilarity and a SONSimilarity for each of them,
+    LexiconUnion indexes the union of their words once. Each word keeps a
+    bitmask of the lexicons it is in, and its position in each of them.
+
+    Phonemic (one-edit) neighbors: two words are neighbors inside a
+    lexicon when both are in it, so the neighbor pairs of the union are
+    filtered by the AND of the two masks. The densities of every lexicon
+    come from one pass over the pairs.
+
+    SON (shared stressed syllable) neighbors: each lexicon is filtered
+    from the union's stressed-syllable groups. Which group a word takes
+    its neighbors from depends on the order of the lexicon, so the group
+    is chosen from each lexicon's own positions, as a SONSimilarity over
+    that lexicon alone would.
+
+    Examples:
+
+        union = LexiconUnion({'child3': child3.keys(), 'adult3': adult3.keys()})
+
+        union.phonemic_densities()
+            dict[lexicon] = numpy array of neighbor counts, in lexicon order
+
+        union.son_densities('child3')
+            dict[simtype] = dict[word] = SON density inside child3
+
+        union.cross_densities('child3', 'adult3')
+            number of neighbors of each child3 word that are adult3 words
+
+        union.graph('child3', 'adult3')
+            NeighborGraph over the union vocabulary, with the adult3
+            neighbors of each child3 word
+
+        union = LexiconUnion(lexicons, cache=NeighborhoodCache())
+            Reuses the phonemic pairs and SON entries saved by an earlier
+            run over the same union vocabulary; SON entries only while the
+            syllabifier's cluster tables are unchanged.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by CreateVariables
+
+"""
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighbor_graph import NeighborGraph
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import NeighborhoodIndex
+from completed_projects.rajaram_dissertation.creating_variables.similarity import index_stressed_syllables
+from completed_projects.rajaram_dissertation.creating_variables.syllabifier import SyllableCache
+from scipy import sparse
+
+# SON trim types used in CreateVariables
+SON_TYPES = ('onset-nucleus', 'onset-nucleus-coda')
+
+
+class LexiconUnion():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, lexicons, stress=True, simtypes=SON_TYPES, cache=None):
+        self.names = list(lexicons)
+        if len(self.names) > 64:
+            print('at most 64 lexicons fit in a mask, got', len(self.names))
+            print('LexiconUnion')
+            quit()
+        self.lexicons = dict((name, list(dict.fromkeys(lexicons[name]))) for name in self.names)
+        self.vocabulary = list(dict.fromkeys(word for name in self.names for word in self.lexicons[name]))
+        self.ids = dict((word, wordID) for wordID, word in enumerate(self.vocabulary))
+
+        # masks[word id] has bit i set when the word is in lexicon i
+        self.masks = np.zeros(len(self.vocabulary), dtype=np.uint64)
+        # positions[i, word id] = position of the word in lexicon i, -1 if not in it
+        self.positions = np.full((len(self.names), len(self.vocabulary)), -1, dtype=np.int64)
+        for bit, name in enumerate(self.names):
+            wordIDs = self.word_ids(self.lexicons[name])
+            self.masks[wordIDs] |= np.uint64(1 << bit)
+            self.positions[bit, wordIDs] = np.arange(len(wordIDs))
+
+        # NeighborhoodCache the phonemic pairs and SON entries are kept in, None to always build
+        self.cache = cache
+        self.phonemic = NeighborhoodIndex(self.vocabulary, stress=stress, cache=cache)
+        self.simtypes = simtypes
+        self.son = None
+        self.entries = dict()
+        self.densities = None
+
+    def word_ids(self, words):
+        # numpy array of the union ids of words
+        return np.array([self.ids[word] for word in words], dtype=np.int64)
+
+    def bit(self, name):
+        return np.uint64(1 << self.names.index(name))
+
+    def phonemic_densities(self):
+        # dict[lexicon] = neighbor counts of its words, in lexicon order, from one pass over the pairs
+        if self.densities is not None:
+            return self.densities
+        (left, right) = (self.phonemic.left, self.phonemic.right)
+        shared = self.masks[left] & self.masks[right]
+        densities = dict()
+        for bit, name in enumerate(self.names):
+            inside = (shared >> np.uint64(bit)) & np.uint64(1) == 1
+            counts = np.bincount(left[inside], minlength=len(self.vocabulary))
+            counts += np.bincount(right[inside], minlength=len(self.vocabulary))
+            densities[name] = counts[self.word_ids(self.lexicons[name])]
+        self.densities = densities
+        return densities
+
+    def cross_densities(self, source, target):
+        # number of neighbors of each source word (in source order) that are target words
+        (left, right) = self.cross_pairs(source, target)
+        counts = np.bincount(left, minlength=len(self.vocabulary))
+        return counts[self.word_ids(self.lexicons[source])]
+
+    def cross_pairs(self, source, target=None):
+        # (source word id, target word id) of every neighbor pair, both ways round
+        if target is None:
+            target = source
+        (left, right) = (self.phonemic.left, self.phonemic.right)
+        sourceBit = self.bit(source)
+        targetBit = self.bit(target)
+        forward = ((self.masks[left] & sourceBit) != 0) & ((self.masks[right] & targetBit) != 0)
+        backward = ((self.masks[right] & sourceBit) != 0) & ((self.masks[left] & targetBit) != 0)
+        return (np.concatenate((left[forward], right[backward])), np.concatenate((right[forward], left[backward])))
+
+    def graph(self, source, target=None):
+        # NeighborGraph over the union vocabulary: row of each source word lists its neighbors in target
+        (rows, columns) = self.cross_pairs(source, target)
+        size = len(self.vocabulary)
+        adjacency = sparse.csr_matrix((np.ones(len(rows), dtype=np.uint8), (rows, columns)), shape=(size, size))
+        adjacency.sort_indices()
+        return NeighborGraph(self.vocabulary, adjacency)
+
+    def son_index(self):
+        # the union's StressedSyllableIndex of each simtype, built on first use
+        if self.son is None:
+            cache = SyllableCache()
+            infos = [cache.lookup(word) for word in self.vocabulary]
+            self.son = index_stressed_syllables(self.vocabulary, [info.boundaries for info in infos],
+                                                [info.spans for info in infos], self.simtypes)
+        return self.son
+
+    def son_entries(self, simtype):
+        """
+
+        :param simtype: one of self.simtypes
+        :return: dict of arrays with one entry per (word, key) of the union's
+                 SON index: words, keys, orders (the key's place among the
+                 word's keys), and groups (number of keys)
+        """
+        if not simtype in self.entries:
+            def build():
+                index = self.son_index()[simtype]
+                sizes = [len(keys) for keys in index.wordkeys]
+                keys = np.fromiter((key for wordkeys in index.wordkeys for key in wordkeys), dtype=np.int64, count=sum(sizes))
+                return {'words': np.repeat(np.arange(len(index.wordkeys)), sizes),
+                        'keys': keys,
+                        'orders': np.arange(len(keys)) - np.repeat(np.cumsum(sizes) - sizes, sizes),
+                        'groups': np.array([len(index.members)])}
+            if self.cache is None:
+                self.entries[simtype] = build()
+            else:
+                # the groups change with the syllabifier's cluster tables, which are edited by hand
+                parameters = {'simtype': simtype, 'syllabifier': SyllableCache().rules_digest()}
+                self.entries[simtype] = self.cache.fetch('son', self.vocabulary, parameters, build)
+        return self.entries[simtype]
+
+    def son_densities(self, name):
+        """ Same densities as SONSimilarity(lexicon).stress_onset_nucleus_density(simtype)
+
+        :param name: lexicon
+        :return: dict[simtype] = dict[word] = density, for words with a stressed syllable
+        """
+        positions = self.positions[self.names.index(name)]
+        densities = dict()
+        for simtype in self.simtypes:
+            entries = self.son_entries(simtype)
+            groups = int(entries['groups'][0])
+            (words, keys, orders) = (entries['words'], entries['keys'], entries['orders'])
+            inside = positions[words] >= 0
+            (words, keys, orders) = (words[inside], keys[inside], orders[inside])
+            wordPositions = positions[words]
+
+            # a key is first seen at its earliest word in the lexicon, then in that word's key order
+            counts = np.bincount(keys, minlength=groups)
+            first = np.full(groups, len(self.vocabulary), dtype=np.int64)
+            np.minimum.at(first, keys, wordPositions)
+            firstOrder = np.zeros(groups, dtype=np.int64)
+            atFirst = wordPositions == first[keys]
+            firstOrder[keys[atFirst]] = orders[atFirst]
+            rank = first * (int(entries['orders'].max(initial=0)) + 1) + firstOrder
+
+            # each word takes the neighbors of its key seen latest
+            order = np.lexsort((rank[keys], wordPositions))
+            last = np.flatnonzero(np.append(wordPositions[order][1:] != wordPositions[order][:-1], True))
+            homes = keys[order][last]
+            counts = counts[homes] - 1
+            densities[simtype] = dict(zip([self.vocabulary[wordID] for wordID in words[order][last]], counts.tolist()))
+        return densities
@@ -0,0 +1,159 @@
+""" Neighbor graph of a lexicon as a sparse matrix
+
+    A NeighborGraph holds a vocabulary (numpy array of words) and a
+    scipy.sparse CSR adjacency matrix over it: row i lists the ids of the
+    neighbors of vocabulary[i]. Both similarity engines can produce one:
+
+        graph = SONSimilarity(words).stress_onset_nucleus_graph('onset-nucleus')
+        graph = PhonemicSimilarity(words).findPhonemicGraph(words, True)
+
+    Phonemic neighbors are symmetric. SON neighbors are not always: a word
+    with several stressed syllables only takes the neighbors of one of
+    them, so its row can leave out words whose rows list it.
+
+    Examples:
+
+        graph.save('three_SAD.npz')
+        graph = load_graph('three_SAD.npz')
+            Keeps the vocabulary and the matrix in one .npz file.
+
+        graph.degrees()
+            numpy array with the number of neighbors of each word
+
+        graph.to_dict()
+            dict[word] = set of neighbor words
+
+        graph.subgraph(words)
+            NeighborGraph over just those words, e.g. one lexicon of a
+            graph built over the union of several
+
+        adult = graph.frequency_vector(adult_lexicon, 'NUMCHILD')
+        graph.neighborhood_frequency({'pct_adult': adult, 'token': token})['pct_adult']['mean']
+            Neighborhood frequency of every word: the adjacency matrix times
+            the frequency vectors, giving the sum, mean and mean log
+            frequency of the neighbors for all vectors in one call.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by SONSimilarity and PhonemicSimilarity
+
+"""
+import numpy as np
+from scipy import sparse
+
+
+class NeighborGraph():
+    """ Vocabulary and CSR adjacency; see header for complete documentation """
+
+    def __init__(self, vocabulary, adjacency):
+        self.vocabulary = np.asarray(vocabulary, dtype=str)
+        self.adjacency = sparse.csr_matrix(adjacency)
+        self.ids = dict((word, wordID) for wordID, word in enumerate(self.vocabulary.tolist()))
+
+    def degrees(self):
+        return np.diff(self.adjacency.indptr)
+
+    def neighbors(self, word):
+        # numpy array of the neighbors of one word
+        wordID = self.ids[word]
+        row = self.adjacency.indices[self.adjacency.indptr[wordID]:self.adjacency.indptr[wordID + 1]]
+        return self.vocabulary[row]
+
+    def to_dict(self):
+        words = self.vocabulary.tolist()
+        indptr = self.adjacency.indptr
+        indices = self.adjacency.indices
+        return dict((word, set(words[neighbor] for neighbor in indices[indptr[wordID]:indptr[wordID + 1]]))
+                    for wordID, word in enumerate(words))
+
+    def subgraph(self, words):
+        # NeighborGraph over words only, in their order, keeping the links among them
+        rows = np.array([self.ids[word] for word in words], dtype=np.int64)
+        return NeighborGraph(self.vocabulary[rows], self.adjacency[rows][:, rows])
+
+    def frequency_vector(self, lexicon, field, missing=0.0):
+        # numpy array of lexicon[word][field] aligned with the vocabulary, missing for words not in lexicon
+        vector = np.full(len(self.vocabulary), missing, dtype=np.float64)
+        for wordID, word in enumerate(self.vocabulary.tolist()):
+            if word in lexicon:
+                vector[wordID] = lexicon[word][field]
+        return vector
+
+    def neighborhood_frequency(self, frequencies):
+        """ Sum, mean and mean log frequency of each word's neighbors, for
+            every frequency vector at once, as two sparse matrix products.
+
+        :param frequencies: dict[name] = numpy array aligned with the vocabulary
+        :return: dict[name] = dict with 'sum', 'mean' and 'meanlog' arrays;
+                 the mean of a word without neighbors is 0, and meanlog
+                 averages log(1 + frequency)
+        """
+        names = list(frequencies)
+        columns = np.column_stack([np.asarray(frequencies[name], dtype=np.float64) for name in names])
+        sums = self.adjacency @ columns
+        logsums = self.adjacency @ np.log1p(columns)
+        degrees = self.degrees().astype(np.float64)[:, None]
+        divisor = np.where(degrees > 0, degrees, 1.0)
+        means = np.where(degrees > 0, sums / divisor, 0.0)
+        meanlogs = np.where(degrees > 0, logsums / divisor, 0.0)
+        result = dict()
+        for column, name in enumerate(names):
+            result[name] = {'sum': sums[:, column], 'mean': means[:, column], 'meanlog': meanlogs[:, column]}
+        return result
+
+    def save(self, path):
+        np.savez_compressed(path, vocabulary=self.vocabulary, data=self.adjacency.data,
+                            indices=self.adjacency.indices, indptr=self.adjacency.indptr,
+                            shape=np.array(self.adjacency.shape))
+
+
+def load_graph(path):
+    """
+
+    :param path: .npz file written by NeighborGraph.save
+    :return: NeighborGraph
+    """
+    saved = np.load(path)
+    adjacency = sparse.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+    return NeighborGraph(saved['vocabulary'], adjacency)
+
+
+def graph_from_pairs(vocabulary, left, right):
+    """
+
+    :param vocabulary: words, in id order
+    :param left: ids of one side of each undirected neighbor pair
+    :param right: ids of the other side
+    :return: symmetric NeighborGraph
+    """
+    size = len(vocabulary)
+    rows = np.concatenate((left, right))
+    columns = np.concatenate((right, left))
+    adjacency = sparse.csr_matrix((np.ones(len(rows), dtype=np.uint8), (rows, columns)), shape=(size, size))
+    adjacency.sum_duplicates()
+    adjacency.data[:] = 1
+    return NeighborGraph(vocabulary, adjacency)
+
+
+def graph_from_groups(vocabulary, home, members):
+    """ Neighbors are the other words of one group: adjacency = R * M^T - I
+
+    :param vocabulary: words, in id order
+    :param home: group id each word takes its neighbors from, -1 for none
+    :param members: list of word ids of each group
+    :return: NeighborGraph
+    """
+    size = len(vocabulary)
+    home = np.asarray(home, dtype=np.int64)
+    sizes = [len(group) for group in members]
+    groupIDs = np.repeat(np.arange(len(members)), sizes)
+    wordIDs = np.fromiter((wordID for group in members for wordID in group), dtype=np.int64, count=sum(sizes))
+    membership = sparse.csr_matrix((np.ones(len(wordIDs), dtype=np.int32), (groupIDs, wordIDs)),
+                                   shape=(len(members), size))
+    stressed = np.flatnonzero(home >= 0)
+    homes = sparse.csr_matrix((np.ones(len(stressed), dtype=np.int32), (stressed, home[stressed])),
+                              shape=(size, len(members)))
+    selves = sparse.csr_matrix((np.ones(len(stressed), dtype=np.int32), (stressed, stressed)), shape=(size, size))
+    adjacency = (homes @ membership - selves).tocsr()
+    adjacency.eliminate_zeros()
+    adjacency.sort_indices()
+    return NeighborGraph(vocabulary, adjacency.astype(np.uint8))
@@ -0,0 +1,92 @@
+""" Keeps built neighborhood indexes on disk between runs
+
+    Each index is saved as a directory of .npy files, one per array, in
+    Locations().neighborhood_cache. The directory name carries a hash of
+    the kind of index, its parameters and the exact word list, so an index
+    is only reused for the same words in the same order; any change to the
+    lexicons gives a new name and a fresh build. Saved arrays are
+    memory-mapped when loaded, so a later run reads only what it uses.
+
+    Examples:
+
+        cache = NeighborhoodCache()
+        arrays = cache.fetch('phonemic', words, {'stress': True}, build)
+            Loads the arrays saved for these words and parameters, or calls
+            build() for a dict of numpy arrays and saves them first.
+
+        NeighborhoodIndex(words, cache=NeighborhoodCache())
+            Phonemic neighbor pairs read from the cache when present.
+
+    NOTE: delete the directory to clear the cache; nothing is removed
+    automatically.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by NeighborhoodIndex, StressNeighborhoods and LexiconUnion
+
+"""
+import hashlib
+import os
+import shutil
+
+import numpy as np
+from completed_projects.rajaram_dissertation.locations import Locations
+
+# bump when the saved arrays of any kind change meaning
+CACHE_VERSION = 1
+
+
+class NeighborhoodCache():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = Locations().neighborhood_cache
+        self.directory = directory
+
+    def path(self, kind, words, parameters):
+        digest = hashlib.sha1()
+        digest.update(str(CACHE_VERSION).encode())
+        digest.update(kind.encode())
+        digest.update(repr(sorted(parameters.items())).encode())
+        for word in words:
+            digest.update(word.encode("utf-8"))
+            digest.update(b"\n")
+        return os.path.join(self.directory, kind + "_" + digest.hexdigest()[:16])
+
+    def load(self, kind, words, parameters):
+        # dict[name] = memory-mapped array, None if these words were never saved
+        path = self.path(kind, words, parameters)
+        if not os.path.isdir(path):
+            return None
+        arrays = dict()
+        for filename in sorted(os.listdir(path)):
+            arrays[filename[:-len(".npy")]] = np.load(os.path.join(path, filename), mmap_mode="r")
+        return arrays
+
+    def save(self, kind, words, parameters, arrays):
+        path = self.path(kind, words, parameters)
+        # written under a temporary name so that a half written index is never loaded
+        temp = path + "." + str(os.getpid()) + ".tmp"
+        os.makedirs(temp, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(temp, name + ".npy"), np.asarray(array))
+        try:
+            os.rename(temp, path)
+        except OSError:
+            # another run saved the same index first
+            shutil.rmtree(temp)
+
+    def fetch(self, kind, words, parameters, build):
+        """
+
+        :param kind: name of the index, e.g. phonemic
+        :param words: word list the index is built over, in order
+        :param parameters: dict of everything else the index depends on
+        :param build: function returning dict[name] = numpy array
+        :return: dict[name] = array, loaded or built
+        """
+        arrays = self.load(kind, words, parameters)
+        if arrays is None:
+            arrays = build()
+            self.save(kind, words, parameters, arrays)
+        return arrays
@@ -0,0 +1,383 @@
+""" Finds the one-edit phonological neighbors of every word in a lexicon
+
+    Two words are neighbors when:
+        - they have the same phonemes
+        - they are the same length (at least two phonemes) and differ by
+          one substituted phoneme
+        - the longer one (at least two phonemes) becomes the shorter one
+          when one phoneme is deleted
+    which are the neighbors PhonemicSimilarity has always returned.
+
+    Each phoneme is encoded as a small integer, and each word as a 64 bit
+    polynomial hash of its codes. Deleting any one phoneme from a word
+    gives a deletion hash, computed from the word's prefix and suffix sums
+    without building the shorter string. Candidate pairs are words that
+    share a hash (same phonemes), a deletion hash at the same position
+    (substitutions), or whose hash is the other's deletion hash (additions
+    and deletions). Every candidate is then checked phoneme by phoneme on
+    the padded code arrays, so hash collisions never add a neighbor.
+
+    Examples:
+
+        index = NeighborhoodIndex(words, stress=True)
+        similar = index.neighbors()
+            dict[word] = dict[neighbor] = 1, as returned by
+            PhonemicSimilarity.findPhonemicSimilarity
+
+        graph = index.graph()
+            NeighborGraph (CSR matrix and vocabulary) of the same neighbors
+
+        density = index.densities(words)
+            numpy array with the number of neighbors of each word, counted
+            from the neighbor pairs without building any dicts
+
+        index = NeighborhoodIndex(words, stress=True, jobs=4)
+            Neighbors can only differ in length by one, so the lexicon is
+            split into shards of the words of lengths L - 1 and L, each
+            finding the pairs whose longer word has length L from the
+            deletions of its length L words only, and the shards are run
+            in a pool of 4 processes. The pairs are merged
+            in sorted order, so the result is the same as with jobs=1.
+
+        both = StressNeighborhoods(words)
+        (stressed, unstressed) = both.densities(words)
+            Neighbor counts with and without the stress mark from one set
+            of candidates; both.stressed and both.unstressed are the
+            NeighborhoodIndex of each.
+
+        index = NeighborhoodIndex(words, cache=NeighborhoodCache())
+            Saves the neighbor pairs under a hash of the words, and later
+            runs over the same words memory-map them instead of rebuilding.
+
+        index = NeighborhoodIndex(words, external=ExternalBuild(memory=2 ** 28))
+            For vocabularies whose candidate pairs do not fit in memory;
+            the words, their forms and the pairs are still held in memory.
+            See external_neighborhoods.
+
+    NOTE: when stress is False, the stress mark '1' is removed before
+    comparing, so words that differ only in stress are neighbors.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by PhonemicSimilarity
+            - gives the same neighbors as the old wildcard dicts
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighbor_graph import graph_from_pairs
+
+# odd, so that it has an inverse mod 2**64 and deletion hashes can be shifted down
+HASH_BASE = 0x9E3779B97F4A7C15
+HASH_INVERSE = pow(HASH_BASE, -1, 2 ** 64)
+# separates the deletion hashes of different positions, for substitutions
+POSITION_SALT = 0xC2B2AE3D27D4EB4F
+# candidate pairs checked at once
+VERIFY_BLOCK = 2 ** 15
+
+
+class NeighborhoodIndex():
+    """ One-edit neighbors of a lexicon; see header for complete documentation """
+
+    def __init__(self, words, stress=True, jobs=1, pairs=None, cache=None, external=None):
+        # words are kept once each, in the order given
+        self.words = list(dict.fromkeys(words))
+        self.ids = dict((word, wordID) for wordID, word in enumerate(self.words))
+        self.stress = stress
+        if stress:
+            self.forms = self.words
+        else:
+            self.forms = [word.replace("1", "") for word in self.words]
+        # pairs already found for these words, e.g. by StressNeighborhoods
+        if pairs is None and cache is not None:
+            def build():
+                (left, right) = find_pairs([self.forms], jobs, external)[0]
+                return {'left': left, 'right': right}
+            arrays = cache.fetch('phonemic', self.words, {'stress': stress}, build)
+            pairs = (arrays['left'], arrays['right'])
+        elif pairs is None:
+            pairs = find_pairs([self.forms], jobs, external)[0]
+        (self.left, self.right) = pairs
+
+    def densities(self, words=None):
+        # numpy array of neighbor counts, in the order of words (default: self.words)
+        counts = np.bincount(self.left, minlength=len(self.words)) + np.bincount(self.right, minlength=len(self.words))
+        if words is None:
+            return counts
+        return counts[[self.ids[word] for word in words]]
+
+    def graph(self):
+        # symmetric NeighborGraph over self.words
+        return graph_from_pairs(self.words, self.left, self.right)
+
+    def neighbors(self):
+        # dict[word] = dict[neighbor] = 1, with an empty dict for words without neighbors
+        similar = dict((word, dict()) for word in self.words)
+        for (left, right) in zip(self.left.tolist(), self.right.tolist()):
+            similar[self.words[left]][self.words[right]] = 1
+            similar[self.words[right]][self.words[left]] = 1
+        return similar
+
+
+class StressNeighborhoods():
+    """ Stress-sensitive and stress-insensitive neighbors from one build.
+
+        Stress is treated as a separate mark on the vowel: candidates are
+        found once on the forms without stress, and each candidate is then
+        checked both without and with the stress marks.
+    """
+
+    def __init__(self, words, jobs=1, cache=None, external=None):
+        self.words = list(dict.fromkeys(words))
+        unstressed = [word.replace("1", "") for word in self.words]
+
+        def build():
+            (withoutStress, withStress) = find_pairs([unstressed, self.words], jobs, external)
+            return {'left_unstressed': withoutStress[0], 'right_unstressed': withoutStress[1],
+                    'left_stressed': withStress[0], 'right_stressed': withStress[1]}
+        if cache is None:
+            arrays = build()
+        else:
+            arrays = cache.fetch('phonemic_both', self.words, dict(), build)
+        withoutStress = (arrays['left_unstressed'], arrays['right_unstressed'])
+        withStress = (arrays['left_stressed'], arrays['right_stressed'])
+        self.stressed = NeighborhoodIndex(self.words, stress=True, pairs=withStress)
+        self.unstressed = NeighborhoodIndex(self.words, stress=False, pairs=withoutStress)
+
+    def densities(self, words=None):
+        # (stress-sensitive, stress-insensitive) numpy arrays of neighbor counts, in the order of words
+        return (self.stressed.densities(words), self.unstressed.densities(words))
+
+
+class PhonemeCodes():
+    """ Integer codes of a list of phoneme strings, and the one-edit pairs among them """
+
+    def __init__(self, forms, raw=False):
+        self.forms = forms
+        # raw codes are code point + 1, so the hashes of separately encoded word lists agree
+        self.raw = raw
+        self.encode()
+
+    def encode(self):
+        # codes[word id] = phoneme codes (1 and up), padded with 0 to maxlen + 1
+        self.lengths = np.array([len(form) for form in self.forms], dtype=np.int64)
+        self.starts = np.zeros(len(self.forms) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.starts[1:])
+        points = np.frombuffer("".join(self.forms).encode("utf-32-le"), dtype=np.uint32)
+        if self.raw:
+            self.symbols = None
+            self.flat = points.astype(np.int64) + 1
+            dtype = np.uint32
+        else:
+            (self.symbols, flat) = np.unique(points, return_inverse=True)
+            self.flat = flat.astype(np.int64) + 1
+            if len(self.symbols) < 255:
+                dtype = np.uint8
+            else:
+                dtype = np.uint32
+        self.maxlen = int(self.lengths.max()) if len(self.forms) else 0
+        self.codes = np.zeros((len(self.forms), self.maxlen + 1), dtype=dtype)
+        rows = np.repeat(np.arange(len(self.forms)), self.lengths)
+        columns = np.arange(len(self.flat)) - self.starts[rows]
+        self.codes[rows, columns] = self.flat
+        # word id and position of each phoneme of flat
+        self.rows = rows
+        self.columns = columns
+
+    def hashes(self, minimum=2, length=None):
+        """
+
+        :param minimum: shortest word whose deletions are hashed
+        :param length: if given, only the deletions of the words of this length are hashed
+        :return: (hash of each word,
+                  word id, position and deletion hash of each phoneme of
+                  every word with at least minimum phonemes)
+        """
+        powers = np.ones(self.maxlen + 1, dtype=np.uint64)
+        for exponent in range(1, self.maxlen + 1):
+            powers[exponent] = (int(powers[exponent - 1]) * HASH_BASE) % 2 ** 64
+        exponents = self.lengths[self.rows] - 1 - self.columns
+        terms = self.flat.astype(np.uint64) * powers[exponents]
+        sums = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum(terms, out=sums[1:])
+        full = sums[self.starts[1:]] - sums[self.starts[:-1]]
+
+        keep = self.lengths[self.rows] >= minimum
+        if length is not None:
+            keep &= self.lengths[self.rows] == length
+        positions = np.flatnonzero(keep)
+        wordIDs = self.rows[positions]
+        prefix = sums[positions] - sums[self.starts[wordIDs]]
+        suffix = full[wordIDs] - prefix - terms[positions]
+        deleted = prefix * np.uint64(HASH_INVERSE) + suffix
+        return (full, wordIDs, self.columns[positions], deleted)
+
+    def candidates(self, minimum=2, length=None):
+        """
+
+        :param minimum: shortest word whose deletions are hashed; 1 also
+               gives the pairs of one-phoneme words and of the empty word
+        :param length: if given, only the pairs whose longer word has this
+               length, from the deletions of those words alone
+        :return: (left, right) positions in forms of every pair that may be
+                 one edit apart, left < right, sorted
+        """
+        (full, wordIDs, positions, deleted) = self.hashes(minimum, length)
+        everyone = np.arange(len(self.forms), dtype=np.int64)
+        (same, shorter) = (everyone, everyone)
+        if length is not None:
+            same = np.flatnonzero(self.lengths == length)
+            shorter = np.flatnonzero(self.lengths == length - 1)
+        candidates = [group_pairs(full[same], same),
+                      group_pairs(salt(deleted, positions), wordIDs),
+                      join_pairs(deleted, wordIDs, full[shorter], shorter)]
+        left = np.concatenate([pair[0] for pair in candidates])
+        right = np.concatenate([pair[1] for pair in candidates])
+        (left, right) = (np.minimum(left, right), np.maximum(left, right))
+        size = max(len(self.forms), 1)
+        unique = np.unique(left[left != right] * size + right[left != right])
+        return (unique // size, unique % size)
+
+    def substitutions(self):
+        """ Pairs of the same length that differ in exactly one symbol (Coltheart's N)
+
+        :return: (left, right) positions in forms of every such pair, left < right, sorted
+        """
+        (full, wordIDs, positions, deleted) = self.hashes(minimum=1)
+        (left, right) = group_pairs(salt(deleted, positions), wordIDs)
+        (left, right) = (np.minimum(left, right), np.maximum(left, right))
+        size = max(len(self.forms), 1)
+        unique = np.unique(left[left != right] * size + right[left != right])
+        (left, right) = (unique // size, unique % size)
+        keep = np.zeros(len(left), dtype=bool)
+        for start in range(0, len(left), VERIFY_BLOCK):
+            block = slice(start, start + VERIFY_BLOCK)
+            differences = (self.codes[left[block]] != self.codes[right[block]]).sum(axis=1)
+            keep[block] = (self.lengths[left[block]] == self.lengths[right[block]]) & (differences == 1)
+        return (left[keep], right[keep])
+
+    def verified(self, left, right):
+        # the candidate pairs that are one edit apart in these forms
+        keep = np.zeros(len(left), dtype=bool)
+        for start in range(0, len(left), VERIFY_BLOCK):
+            block = slice(start, start + VERIFY_BLOCK)
+            keep[block] = self.verify(left[block], right[block])
+        return (left[keep], right[keep])
+
+    def pairs(self):
+        # (left, right) positions in forms of every neighbor pair, left < right, sorted
+        return self.verified(*self.candidates())
+
+    def verify(self, left, right):
+        # whether each candidate pair is one edit apart, checked on the codes
+        return verify_codes(self.codes, self.lengths, left, right)
+
+
+def verify_codes(codes, lengths, left, right):
+    """
+
+    :param codes: phoneme codes of each word, padded with 0 to at least one past the longest
+    :param lengths: number of phonemes of each word
+    :param left: row of one word of each candidate pair
+    :param right: row of the other word
+    :return: whether each pair is one edit apart
+    """
+    maxlen = codes.shape[1] - 1
+    longer = np.where(lengths[left] >= lengths[right], left, right)
+    shorter = np.where(lengths[left] >= lengths[right], right, left)
+    longLength = lengths[longer]
+    gap = longLength - lengths[shorter]
+    longCodes = codes[longer]
+    shortCodes = codes[shorter]
+    mismatch = longCodes[:, :maxlen] != shortCodes[:, :maxlen]
+
+    differences = mismatch.sum(axis=1)
+    same = (gap == 0) & ((differences == 0) | ((differences == 1) & (longLength >= 2)))
+
+    # the longer word, with its first mismatching phoneme deleted, must equal the shorter
+    first = mismatch.argmax(axis=1)
+    shifted = longCodes[:, 1:] == shortCodes[:, :maxlen]
+    before = np.arange(maxlen) < first[:, None]
+    added = (gap == 1) & (longLength >= 2) & (before | shifted).all(axis=1)
+    return same | added
+
+
+def salt(deleted, positions):
+    # deletion hashes that only match at the same position, for substitutions
+    return deleted + (positions.astype(np.uint64) + np.uint64(1)) * np.uint64(POSITION_SALT)
+
+
+def find_pairs(formSets, jobs=1, external=None):
+    """ Neighbor pairs of the same words written several ways.
+
+    :param formSets: lists of forms of the same words; candidates come from
+           the first list, and are checked against each list in turn
+    :param jobs: processes; more than 1 runs one shard of the words of
+           lengths L - 1 and L (in the first list) per process, which finds
+           the pairs whose longer word has length L
+    :param external: ExternalBuild to find the pairs on disk instead, under its memory budget
+    :return: list with the (left, right) word ids of the pairs in each form set
+    """
+    if external is not None:
+        return external.pairs(formSets)
+    if jobs <= 1:
+        return verified_pairs(formSets)
+    lengths = np.array([len(form) for form in formSets[0]], dtype=np.int64)
+    shardLengths = np.unique(lengths).tolist()
+    shardIDs = [np.flatnonzero((lengths == length - 1) | (lengths == length)) for length in shardLengths]
+    shardForms = [[[forms[wordID] for wordID in wordIDs] for forms in formSets] for wordIDs in shardIDs]
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        results = list(pool.map(verified_pairs, shardForms, shardLengths))
+    finally:
+        pool.shutdown()
+    size = max(len(formSets[0]), 1)
+    merged = list()
+    for formSet in range(len(formSets)):
+        # shard ids are ascending, so left < right holds after mapping back; no pair is in two shards
+        keys = [np.zeros(0, dtype=np.int64)]
+        for wordIDs, shard in zip(shardIDs, results):
+            (left, right) = shard[formSet]
+            keys.append(wordIDs[left] * size + wordIDs[right])
+        unique = np.sort(np.concatenate(keys))
+        merged.append((unique // size, unique % size))
+    return merged
+
+
+def verified_pairs(formSets, length=None):
+    # find_pairs on one process; with length, only pairs whose longer word has that length (in the first list)
+    codes = [PhonemeCodes(forms) for forms in formSets]
+    if len(formSets) == 1:
+        (left, right) = codes[0].candidates(length=length)
+    else:
+        # another form set can be one edit apart where the first is not, e.g. a1 and e1 are
+        # substitutions but a and e are too short; those pairs share a one-phoneme deletion
+        (left, right) = codes[0].candidates(minimum=1, length=length)
+    return [formCodes.verified(left, right) for formCodes in codes]
+
+
+def group_pairs(keys, ids):
+    # (left, right) ids of every two entries with the same key
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    ids = ids[order]
+    if len(keys) < 2:
+        return (ids[:0], ids[:0])
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    sizes = np.diff(np.append(starts, len(keys)))
+    ends = np.repeat(starts + sizes, sizes)
+    counts = ends - np.arange(len(keys)) - 1
+    leftPositions = np.repeat(np.arange(len(keys)), counts)
+    rightPositions = leftPositions + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (ids[leftPositions], ids[rightPositions])
+
+
+def join_pairs(keys, ids, otherKeys, otherIDs):
+    # (id, other id) of every entry of keys with an entry of otherKeys that has the same key
+    order = np.argsort(otherKeys, kind="stable")
+    otherKeys = otherKeys[order]
+    otherIDs = otherIDs[order]
+    low = np.searchsorted(otherKeys, keys, side="left")
+    counts = np.searchsorted(otherKeys, keys, side="right") - low
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (np.repeat(ids, counts), otherIDs[np.repeat(low, counts) + offsets])
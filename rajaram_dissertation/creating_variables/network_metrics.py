@@ -0,0 +1,138 @@
+""" Lexical network ("hairball") measures of every word in a neighbor graph
+
+    Works on a NeighborGraph from PhonemicSimilarity.findPhonemicGraph,
+    SONSimilarity.stress_onset_nucleus_graph or LexiconUnion.graph. The
+    graph is treated as undirected: a SON link in either direction links
+    the two words. Every measure is computed with sparse matrix products
+    or scipy.sparse.csgraph, so they scale to graphs of 100k words.
+
+        clustering: share of the pairs of a word's neighbors that are
+                    neighbors of each other (0 with fewer than 2 neighbors)
+        two_hop: number of other words within two links
+        component_size: number of words in the word's connected component
+        giant_component: whether the word is in the largest component
+        closeness: (component size - 1) / sum of the distances to the
+                   other words of its component, 0 for isolated words
+        k_core: largest k such that the word is in a subgraph where every
+                word has at least k neighbors
+
+    Examples:
+
+        metrics = NetworkMetrics(graph)
+        metrics.clustering()
+            numpy array aligned with graph.vocabulary
+
+        metrics.closeness(samples=500)
+            In components larger than 500 words, distances are measured
+            from 500 randomly chosen words only, and each word's sum of
+            distances is scaled up from them: an estimate, repeatable with
+            the same seed (default 0). Without samples it is exact.
+
+        metrics.all()
+            dict[measure] = numpy array, for every measure above
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by CreateVariables
+
+"""
+import numpy as np
+from scipy.sparse import csgraph
+
+# distance entries computed at once by closeness
+DISTANCE_BLOCK = 2 ** 22
+
+
+class NetworkMetrics():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, graph):
+        self.graph = graph
+        adjacency = graph.adjacency
+        adjacency = ((adjacency + adjacency.T) > 0).astype(np.int64).tocsr()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        self.adjacency = adjacency
+        self.size = adjacency.shape[0]
+        self.degrees = np.diff(adjacency.indptr)
+        (self.count, self.labels) = csgraph.connected_components(adjacency, directed=False)
+        self.sizes = np.bincount(self.labels, minlength=self.count)
+
+    def clustering(self):
+        # triangles through each word, over the pairs of its neighbors
+        triangles = np.asarray((self.adjacency @ self.adjacency).multiply(self.adjacency).sum(axis=1)).ravel() / 2
+        pairs = self.degrees * (self.degrees - 1) / 2
+        return np.where(pairs > 0, triangles / np.where(pairs > 0, pairs, 1), 0.0)
+
+    def two_hop(self):
+        reach = self.adjacency + self.adjacency @ self.adjacency
+        reach = reach.tocsr()
+        reach.setdiag(0)
+        reach.eliminate_zeros()
+        return np.diff(reach.indptr)
+
+    def component_size(self):
+        return self.sizes[self.labels]
+
+    def giant_component(self):
+        if self.size == 0:
+            return np.zeros(0, dtype=bool)
+        return self.labels == np.argmax(self.sizes)
+
+    def closeness(self, samples=None, seed=0):
+        """
+
+        :param samples: largest number of words distances are measured from
+               in one component; None measures from every word (exact)
+        :param seed: random seed for choosing the sampled words
+        :return: numpy array of closeness, aligned with the vocabulary
+        """
+        generator = np.random.default_rng(seed)
+        closeness = np.zeros(self.size, dtype=np.float64)
+        # two words: each is one link from the other
+        closeness[self.sizes[self.labels] == 2] = 1.0
+        order = np.argsort(self.labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(self.sizes)))
+        for component in np.flatnonzero(self.sizes > 2):
+            words = order[starts[component]:starts[component + 1]]
+            graph = self.adjacency[words][:, words]
+            size = len(words)
+            if samples is None or size <= samples:
+                sources = np.arange(size)
+            else:
+                sources = generator.choice(size, samples, replace=False)
+            totals = np.zeros(size, dtype=np.float64)
+            block = max(1, DISTANCE_BLOCK // size)
+            for start in range(0, len(sources), block):
+                distances = csgraph.shortest_path(graph, directed=False, unweighted=True,
+                                                  indices=sources[start:start + block])
+                totals += distances.sum(axis=0)
+            # distances are symmetric, so the column sums are each word's distances to the sources
+            totals *= size / len(sources)
+            closeness[words] = (size - 1) / totals
+        return closeness
+
+    def k_core(self):
+        # peels every word of degree <= k at once, until none is left at that k
+        core = np.zeros(self.size, dtype=np.int64)
+        degrees = self.degrees.copy()
+        alive = np.ones(self.size, dtype=bool)
+        k = 0
+        while alive.any():
+            peel = alive & (degrees <= k)
+            if not peel.any():
+                k = int(degrees[alive].min())
+                continue
+            while peel.any():
+                core[peel] = k
+                alive &= ~peel
+                degrees -= self.adjacency @ peel.astype(np.int64)
+                peel = alive & (degrees <= k)
+        return core
+
+    def all(self, samples=None, seed=0):
+        return {'clustering': self.clustering(),
+                'two_hop': self.two_hop(),
+                'component_size': self.component_size(),
+                'giant_component': self.giant_component(),
+                'closeness': self.closeness(samples, seed),
+                'k_core': self.k_core()}
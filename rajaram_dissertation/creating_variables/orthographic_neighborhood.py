@@ -0,0 +1,67 @@
+""" Orthographic neighbors (Coltheart's N) of the words of a lexicon
+
+    Two words are orthographic neighbors when their spellings have the same
+    length and differ in exactly one letter. The neighbors are found with
+    the same machinery as the phonemic ones (see neighborhood_index), on
+    letters instead of Klattese symbols: each spelling is hashed with one
+    of its letters deleted, spellings that share a deletion hash at the
+    same position are candidates, and every candidate is checked letter by
+    letter. Words with the same spelling are not neighbors.
+
+    Words are kept by their Klattese form, so the graph lines up with the
+    lexicons and their frequencies; only the comparison uses the spelling.
+
+    Examples:
+
+        orth = OrthographicNeighborhood(child.keys(), [root_spelling(child[phon]['ORTH']) for phon in child])
+        orth.densities()
+            numpy array of Coltheart's N, in the order of the words
+
+        graph = orth.graph()
+            NeighborGraph over the words, e.g. for neighborhood_frequency
+
+        root_spelling('box:boxes|box')
+            'box': the spelling of the first alternative of an ORTH field,
+            before the ':' of a root reduction
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by CreateVariables
+
+"""
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighbor_graph import graph_from_pairs
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import PhonemeCodes
+
+
+class OrthographicNeighborhood():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, words, spellings):
+        # words are kept once each, in the order given, with the spelling first given for them
+        self.spellings = dict()
+        for word, spelling in zip(words, spellings):
+            self.spellings.setdefault(word, spelling)
+        self.words = list(self.spellings)
+        self.ids = dict((word, wordID) for wordID, word in enumerate(self.words))
+        (self.left, self.right) = PhonemeCodes([self.spellings[word] for word in self.words]).substitutions()
+
+    def densities(self, words=None):
+        # numpy array of neighbor counts, in the order of words (default: self.words)
+        counts = np.bincount(self.left, minlength=len(self.words)) + np.bincount(self.right, minlength=len(self.words))
+        if words is None:
+            return counts
+        return counts[[self.ids[word] for word in words]]
+
+    def graph(self):
+        # symmetric NeighborGraph over self.words
+        return graph_from_pairs(self.words, self.left, self.right)
+
+
+def root_spelling(orth):
+    """
+
+    :param orth: ORTH field of a lexicon entry, alternatives joined by '|',
+           root reductions written root:original
+    :return: spelling the word was translated from
+    """
+    return orth.split('|')[0].split(':')[0]
@@ -0,0 +1,208 @@
+""" Mean phonological Levenshtein distance to the nearest words (PLD20)
+
+    PLD20 is the mean edit distance from a word to the 20 other words of the
+    lexicon closest to it. Instead of all word pairs, the distances are
+    computed a length band at a time: two words of lengths m and n are at
+    least |m - n| edits apart, so the words of a length L are first compared
+    with the other words of length L, then with lengths L - 1 and L + 1, and
+    so on. A word stops being compared as soon as its 20th best distance is
+    no larger than the next band's gap, since no word further out can beat
+    it.
+
+    Within a band the Levenshtein table of every (query, target) pair is
+    filled at once, one cell at a time on numpy arrays of all the pairs.
+    Pairs are dropped before the table when the phonemes the two forms do
+    not share already take as many edits as the query's 20th best, and
+    while it is filled, as soon as the smallest entry of their row does.
+
+    Words with the same phonemes once stress is ignored (the default) are
+    distinct words 0 edits apart, and count among each other's nearest, as
+    they do in the SAD neighborhoods of a lexicon without stress.
+
+    Examples:
+
+        distance = PhonologicalDistance(words)
+        distance.pld(20)
+            numpy array of PLD20, in the order of words; nan for a word
+            whose lexicon has no other word
+
+        distance.nearest(20)
+            numpy array (words x 20) of the sorted distances from each word
+            to its nearest other words, inf past the last
+
+        PhonologicalDistance(words, stress=True, jobs=4)
+            Keeps the stress mark as a phoneme, and splits the words of
+            each length over a pool of 4 processes; each process is sent
+            the codes of the lexicon once. Only worth it for large
+            lexicons: on small ones starting the pool costs more than the
+            distances.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by CreateVariables
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import PhonemeCodes
+
+# distance entries filled at once
+DISTANCE_BLOCK = 2 ** 20
+# targets in the first block of each band, per nearest form wanted
+FIRST_TARGETS = 4
+# distance of a pair not yet found, or not worth finishing
+FAR = np.iinfo(np.int16).max
+
+
+class PhonologicalDistance():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, words, stress=False, jobs=1):
+        self.words = list(dict.fromkeys(words))
+        self.stress = stress
+        self.jobs = jobs
+        if stress:
+            forms = self.words
+        else:
+            forms = [word.replace("1", "") for word in self.words]
+        self.codes = PhonemeCodes(forms)
+
+    def nearest(self, count=20):
+        lengths = self.codes.lengths
+        # the words of each length, split in one part per process so the longest band does not run alone
+        parts = [part for length in np.unique(lengths)
+                 for part in np.array_split(np.flatnonzero(lengths == length), self.jobs) if len(part)]
+        if self.jobs <= 1:
+            results = [nearest_of_length(self.codes.codes, lengths, part, count) for part in parts]
+        else:
+            # the codes go to each process once, and each part sends only its query ids
+            pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=share_codes,
+                                       initargs=(self.codes.codes, lengths))
+            try:
+                results = list(pool.map(nearest_of_part, parts, [count] * len(parts)))
+            finally:
+                pool.shutdown()
+        distances = np.full((len(self.words), count), np.inf)
+        for (wordIDs, found) in results:
+            distances[wordIDs] = np.where(found == FAR, np.inf, found)
+        return distances
+
+    def pld(self, count=20):
+        # mean distance to the count nearest other words, in the order of self.words
+        distances = self.nearest(count)
+        found = np.isfinite(distances)
+        totals = np.where(found, distances, 0.0).sum(axis=1)
+        numbers = found.sum(axis=1)
+        means = np.where(numbers > 0, totals / np.where(numbers > 0, numbers, 1), np.nan)
+        return means
+
+
+# codes and lengths of the lexicon, in each process of a pool
+SHARED = dict()
+
+
+def share_codes(codes, lengths):
+    SHARED['codes'] = codes
+    SHARED['lengths'] = lengths
+
+
+def nearest_of_part(queries, count):
+    # nearest_of_length on the codes shared with this process
+    return nearest_of_length(SHARED['codes'], SHARED['lengths'], queries, count)
+
+
+def nearest_of_length(codes, lengths, queries, count):
+    """
+
+    :param codes: phoneme codes of each form, padded with 0
+    :param lengths: number of phonemes of each form
+    :param queries: ids of the forms to search from, all of one length
+    :param count: number of nearest forms
+    :return: (queries, int16 array of their sorted distances to the count
+             nearest other forms, FAR past the last)
+    """
+    length = int(lengths[queries[0]])
+    best = np.full((len(queries), count), FAR, dtype=np.int16)
+    maxlen = int(lengths.max())
+    for gap in range(0, maxlen + 1):
+        if not (best[:, -1] > gap).any():
+            break
+        for targetLength in sorted(set((length - gap, length + gap))):
+            targets = np.flatnonzero(lengths == targetLength)
+            # only a distance below the count-th best changes the result
+            active = np.flatnonzero(best[:, -1] > gap)
+            if len(targets) == 0 or len(active) == 0:
+                continue
+            targetBlock = max(1, min(len(targets), DISTANCE_BLOCK // len(active)))
+            queryBlock = max(1, DISTANCE_BLOCK // targetBlock)
+            # a small first block of targets gives every query a limit to prune the rest with
+            starts = [0] + list(range(min(len(targets), FIRST_TARGETS * count), len(targets), targetBlock))
+            ends = starts[1:] + [len(targets)]
+            for queryStart in range(0, len(active), queryBlock):
+                rows = active[queryStart:queryStart + queryBlock]
+                for (targetStart, targetEnd) in zip(starts, ends):
+                    columns = targets[targetStart:targetEnd]
+                    found = distance_block(codes[queries[rows], :length], codes[columns, :targetLength],
+                                           best[rows, -1])
+                    if gap == 0:
+                        found[queries[rows][:, None] == columns[None, :]] = FAR
+                    merged = np.concatenate((best[rows], found), axis=1)
+                    if merged.shape[1] > count:
+                        merged = np.partition(merged, count - 1, axis=1)[:, :count]
+                    best[rows] = np.sort(merged, axis=1)
+    return (queries, best)
+
+
+def distance_block(first, second, limits):
+    """ Levenshtein distances of every pair of rows, one table cell at a time.
+
+    :param first: codes of the query forms, all of one length
+    :param second: codes of the target forms, all of one length
+    :param limits: distance each query must beat to matter
+    :return: int16 array (queries x targets); FAR for the pairs that cannot beat their limit
+    """
+    (rows, columns) = (first.shape[1], second.shape[1])
+    found = np.full((len(first), len(second)), FAR, dtype=np.int16)
+    # phonemes the two forms do not share: the longer form has at least that many edits to make
+    symbols = int(max(first.max(initial=0), second.max(initial=0))) + 1
+    firstCounts = symbol_counts(first, symbols)
+    secondCounts = symbol_counts(second, symbols)
+    shared = np.zeros(found.shape, dtype=np.uint8)
+    for symbol in np.unique(first):
+        shared += np.minimum(firstCounts[:, symbol][:, None], secondCounts[:, symbol][None, :])
+    (queries, targets) = np.nonzero(shared > max(rows, columns) - limits[:, None])
+    if len(queries) == 0:
+        return found
+
+    # one column per pair: the codes of each pair's two forms, and
+    # previous[j] = distances from the first i phonemes of the query to the first j of the target
+    dtype = np.int8 if max(rows, columns) < np.iinfo(np.int8).max else np.int16
+    queryCodes = first[queries].T
+    targetCodes = second[targets].T
+    previous = np.empty((columns + 1, len(queries)), dtype=dtype)
+    previous[:] = np.arange(columns + 1, dtype=dtype)[:, None]
+    for row in range(1, rows + 1):
+        current = np.empty_like(previous)
+        current[0] = row
+        phonemes = queryCodes[row - 1]
+        for column in range(1, columns + 1):
+            cell = current[column]
+            np.add(previous[column - 1], phonemes != targetCodes[column - 1], out=cell, casting="unsafe")
+            np.minimum(cell, previous[column] + 1, out=cell)
+            np.minimum(cell, current[column - 1] + 1, out=cell)
+        # a pair whose whole row is at or over its limit can only end there too
+        alive = current.min(axis=0) < limits[queries]
+        if not alive.all():
+            (current, queries, targets) = (current[:, alive], queries[alive], targets[alive])
+            (queryCodes, targetCodes) = (queryCodes[:, alive], targetCodes[:, alive])
+        previous = current
+    found[queries, targets] = previous[columns]
+    return found
+
+
+def symbol_counts(codes, symbols):
+    # counts[form, symbol] = number of times the symbol is in the form
+    counts = np.zeros((len(codes), symbols), dtype=np.uint8)
+    for column in range(codes.shape[1]):
+        counts[np.arange(len(codes)), codes[:, column]] += 1
+    return counts
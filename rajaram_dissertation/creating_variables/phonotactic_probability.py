@@ -0,0 +1,100 @@
+""" Positional segment and biphone probabilities (phonotactic probability)
+
+    Counted over a reference lexicon, as in Vitevitch & Luce (2004):
+
+        segment probability of phoneme s at position i:
+            words with s at i / words with any phoneme at i
+        biphone probability of phonemes s t at positions i, i + 1:
+            words with s t at i / words with any two phonemes at i
+
+    A word's score is the sum of the probabilities of its phonemes (or
+    phoneme pairs) at their positions. With weights, each reference word
+    counts by its weight instead of 1, e.g. log(1 + TOKEN) for the frequency
+    weighted measures. Phonemes or positions never seen in the reference
+    add 0. The stress mark is not a phoneme, and is removed first.
+
+    Every lexicon is encoded as a padded integer array (see PhonemeCodes),
+    each table is filled with one bincount, and words are scored by
+    indexing the tables with their codes, so there is no loop over words.
+
+    Examples:
+
+        phonotactics = PhonotacticProbability(adult.keys())
+        phonotactics.segment(child.keys())
+            numpy array of summed positional segment probabilities
+        phonotactics.biphone(child.keys())
+            numpy array of summed biphone probabilities
+
+        tokens = np.log1p([adult[phon]['TOKEN'] for phon in adult])
+        PhonotacticProbability(adult.keys(), tokens).segment(child.keys())
+            The same, weighting each adult word by its log token count.
+
+    LAST EXAMINED: 10-18-26
+    STATUS: - used by CreateVariables
+
+"""
+import numpy as np
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import PhonemeCodes
+
+
+class PhonotacticProbability():
+    """ Only class in module; see header for complete documentation """
+
+    def __init__(self, words, weights=None):
+        codes = self.encode(words)
+        if weights is None:
+            weights = np.ones(len(codes.forms))
+        weights = np.asarray(weights, dtype=np.float64)
+        # symbols[k - 1] = raw code of phoneme k; 0 is padding, and len(symbols) + 1 any unseen phoneme
+        self.symbols = np.unique(codes.flat)
+        self.size = len(self.symbols) + 2
+        self.width = codes.maxlen
+        dense = self.dense(codes.codes[:, :self.width])
+        present = dense > 0
+
+        # segments[i, k] = probability of phoneme k at position i
+        positions = np.broadcast_to(np.arange(self.width), dense.shape)
+        wordWeights = np.broadcast_to(weights[:, None], dense.shape)
+        counts = np.bincount((positions * self.size + dense)[present], weights=wordWeights[present],
+                             minlength=self.width * self.size)
+        self.segments = probabilities(counts.reshape(self.width, self.size))
+
+        # biphones[i, k * size + l] = probability of phonemes k, l at positions i, i + 1
+        pairs = present[:, 1:]
+        keys = (positions[:, :-1] * self.size + dense[:, :-1]) * self.size + dense[:, 1:]
+        counts = np.bincount(keys[pairs], weights=wordWeights[:, 1:][pairs],
+                             minlength=max(self.width - 1, 0) * self.size * self.size)
+        self.biphones = probabilities(counts.reshape(max(self.width - 1, 0), self.size * self.size))
+
+    def encode(self, words):
+        return PhonemeCodes([word.replace("1", "") for word in words], raw=True)
+
+    def dense(self, raw):
+        # phoneme numbers of the reference for raw codes: 0 stays padding, unseen phonemes get the last number
+        found = np.searchsorted(self.symbols, raw)
+        seen = np.isin(raw, self.symbols)
+        return np.where(raw == 0, 0, np.where(seen, found + 1, self.size - 1)).astype(np.int64)
+
+    def positions(self, words):
+        # phoneme numbers of words over the reference's positions; later positions never add anything
+        dense = self.dense(self.encode(words).codes[:, :self.width])
+        return np.pad(dense, ((0, 0), (0, self.width - dense.shape[1])))
+
+    def segment(self, words):
+        # sum of the positional segment probabilities of each word
+        dense = self.positions(words)
+        return self.segments[np.arange(self.width), dense].sum(axis=1)
+
+    def biphone(self, words):
+        # sum of the positional biphone probabilities of each word
+        dense = self.positions(words)
+        if self.width < 2:
+            return np.zeros(len(dense))
+        pairs = dense[:, :-1] * self.size + dense[:, 1:]
+        return self.biphones[np.arange(self.width - 1), pairs].sum(axis=1)
+
+
+def probabilities(counts):
+    # each row of counts over its total; padding is never counted, so it keeps probability 0
+    totals = counts.sum(axis=1, keepdims=True)
+    return counts / np.where(totals > 0, totals, 1.0)
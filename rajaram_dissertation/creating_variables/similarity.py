@@ -7,9 +7,12 @@
 
 """
 import re
-from collections import defaultdict
-from copy import copy
-from completed_projects.rajaram_dissertation.creating_variables.syllabifier import Syllabifier
+from completed_projects.rajaram_dissertation.creating_variables.neighbor_graph import graph_from_groups
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_index import NeighborhoodIndex, StressNeighborhoods
+from completed_projects.rajaram_dissertation.creating_variables.syllabifier import SyllableCache, spans_from_boundaries
+
+# every way a stressed syllable can be trimmed, see SyllableSpans.trim
+TRIM_TYPES = ('nucleus', 'onset-nucleus', 'nucleus-coda', 'onset-nucleus-coda', 'onset-nucleus&nucleus-coda')
 
 
 class SONSimilarity():
@@ -17,19 +20,25 @@ class SONSimilarity():
     def __init__(self,phonwords,marked_syllables=False):
         self.marked_syllables = marked_syllables
         if self.marked_syllables:
-            self.phonsyll = phonwords
+            self.phonsyll = list(phonwords)
+            self.spans = [spans_from_boundaries(syll) for syll in self.phonsyll]
         else:
             (self.phonsyll, self.syll2phon, self.phon2syll) = self.createSyllableList(phonwords)
 
     def createSyllableList(self, phonList):
         # note that phonList can be of any iterable type (list, set)
-        findShape = Syllabifier('STRESS')
+        # syllabification is shared with every other user of SyllableCache
+        cache = SyllableCache()
         syllLex = list()
+        # SyllableSpans of each entry of syllLex
+        self.spans = list()
         syll2phon = dict()
         phon2syll = dict()
         for word in phonList:
-            syll = findShape.syllableStructure(word, findShape.CVshape(word))
+            info = cache.lookup(word)
+            syll = info.boundaries
             syllLex.append(syll)
+            self.spans.append(info.spans)
             syll2phon[syll] = word
             phon2syll[word] = syll
         return (syllLex, syll2phon,phon2syll)
@@ -79,52 +88,234 @@ class SONSimilarity():
 
         return trimSyll
 
-    def stress_onset_nucleus_similarity_word(self,simtype='onset-nucleus'):
-        # define_similar_words based on the number of words that share a similar stressed syllable (in any position)
-        # syllable define_similar_words if shares the same onset-nucleus
-
-
-        def o_n_to_wordset(phonSyll,simtype):
-            # returns a dict of all the trimmed stressed syllables in words
-            # words are trimmed (or not) based on the simtype
-
-            # return the dict 'onset_nucleus_to_words' where the trimmed
-            # stressed syllables are the keys, and the value is a set of
-            # words with that stressed syllable
-
-            onset_nucleus_to_words = dict()
-            for word in phonSyll:
-
-                syllables = word.split('_')
-                for position in range(0, len(syllables)):
-                    if "1" in syllables[position]:
-                        onset_nucleus = self.trimSyllable(syllables[position],simtype,word)
-                        for single in onset_nucleus:
-                            try:
-                                words = onset_nucleus_to_words[single]
-                            except KeyError:
-                                words = set()
-                            words.add(word)
-                            onset_nucleus_to_words[single] = words
+    def stress_onset_nucleus_indexes(self,simtypes=TRIM_TYPES):
+        # dict[simtype] = StressedSyllableIndex, all filled from one pass over the stressed syllables
+        if self.marked_syllables:
+            names = self.phonsyll
+        else:
+            names = [self.syll2phon[syll] for syll in self.phonsyll]
+        return index_stressed_syllables(names, self.phonsyll, self.spans, simtypes)
+
+    def stress_onset_nucleus_index(self,simtype='onset-nucleus'):
+        # inverted index from each trimmed stressed syllable to the words that have it
+        return self.stress_onset_nucleus_indexes([simtype])[simtype]
+
+    def stress_onset_nucleus_all(self,simtypes=TRIM_TYPES,with_neighbors=False):
+        # (dict[simtype] = densities, dict[simtype] = neighbor sets or None) from one pass
+        indexes = self.stress_onset_nucleus_indexes(simtypes)
+        densities = dict()
+        neighbors = dict()
+        for simtype, index in indexes.items():
+            densities[simtype] = index.densities()
+            if with_neighbors:
+                neighbors[simtype] = index.neighbors()
+            else:
+                neighbors[simtype] = None
+        return (densities, neighbors)
 
-            return onset_nucleus_to_words
+    def stress_onset_nucleus_graph(self,simtype='onset-nucleus'):
+        # NeighborGraph of the words that share a similar stressed syllable
+        return self.stress_onset_nucleus_index(simtype).graph()
 
-        (o_n_to_words) = o_n_to_wordset(self.phonsyll,simtype)
+    def stress_onset_nucleus_density(self,simtype='onset-nucleus'):
+        # dict[word] = number of similar words, without building the neighbor sets
+        return self.stress_onset_nucleus_index(simtype).densities()
 
+    def stress_onset_nucleus_similarity_word(self,simtype='onset-nucleus'):
+        # define_similar_words based on the number of words that share a similar stressed syllable (in any position)
+        # syllable define_similar_words if shares the same onset-nucleus
         # creates a dict that contains dict[word] = set(similar words)
-        o_n_similarity = dict()
-        # first assigns all similar words
-        for o_n in o_n_to_words:
-            words = o_n_to_words[o_n]
-            for word in words:
-                wordscopy = copy(words)
-                wordscopy.discard(word)
-                if self.marked_syllables:
-                    o_n_similarity[word] = wordscopy
+        return self.stress_onset_nucleus_index(simtype).neighbors()
+
+
+def index_stressed_syllables(words, syllabified, spans, simtypes=TRIM_TYPES):
+    """
+
+    :param words: names the results are keyed by
+    :param syllabified: syllabified form of each word
+    :param spans: SyllableSpans of each word
+    :param simtypes: trim types to index
+    :return: dict[simtype] = StressedSyllableIndex
+    """
+    indexes = dict((simtype, StressedSyllableIndex(simtype)) for simtype in simtypes)
+    for word, syll, wordspans in zip(words, syllabified, spans):
+        wordIDs = [index.add_word(word, syll) for index in indexes.values()]
+        if wordIDs and wordIDs[0] < 0:
+            continue
+        for position in wordspans.stresses:
+            (onset, nucleus, coda, end) = wordspans.syllables[position]
+            if nucleus == coda:
+                print("more or less than one vowel: --",syll, wordspans.syllable(position),'-- define_similar_words -> trimsyllable')
+            for wordID, (simtype, index) in zip(wordIDs, indexes.items()):
+                if nucleus == coda:
+                    index.add_keys(wordID, ["BROKEN"])
                 else:
-                    o_n_similarity[self.syll2phon[word]] = wordscopy
+                    index.add_keys(wordID, wordspans.trim(position,simtype))
+    return indexes
+
+
+class StressedSyllableIndex():
+    """ Trimmed stressed syllable -> ids of the words that have it.
+
+        A word is similar to every other word in the group of one of its
+        trimmed stressed syllables. When a word has several, the group of
+        the syllable that first appeared latest in the lexicon is used, as
+        in the original dict of sets. Every syllable without exactly one vowel
+        shares the single key BROKEN. Results are keyed by words and, as
+        before, the similar words are given in their syllabified form.
+
+        Filled by index_stressed_syllables. After that, add and remove
+        update only the groups of the edited word, and return the words
+        whose density changed. A word added later counts as the last word
+        of the lexicon, so the index always matches a fresh build over the
+        current words in the order they were added.
+    """
+
+    def __init__(self, simtype='onset-nucleus'):
+        self.simtype = simtype
+        # words[word id], None once removed
+        self.words = list()
+        self.syllabified = list()
+        self.ids = dict()
+        self.keys = dict()
+        # members[key id] = word ids, in lexicon order
+        self.members = list()
+        # wordkeys[word id] = key ids of the word, in the order they were trimmed
+        self.wordkeys = list()
+
+    def add_word(self, word, syll):
+        # returns the id of a new word, -1 if the word is already indexed
+        if word in self.ids:
+            return -1
+        wordID = len(self.words)
+        self.ids[word] = wordID
+        self.words.append(word)
+        self.syllabified.append(syll)
+        self.wordkeys.append(list())
+        return wordID
+
+    def add_keys(self, wordID, trims):
+        # puts a word in the group of each trimmed syllable
+        for single in trims:
+            key = self.keys.setdefault(single, len(self.members))
+            if key == len(self.members):
+                self.members.append(dict())
+            if not wordID in self.members[key]:
+                self.members[key][wordID] = None
+                self.wordkeys[wordID].append(key)
+
+    def _rank(self, key):
+        # where a fresh build would have first seen the key
+        first = next(iter(self.members[key]))
+        return (first, self.wordkeys[first].index(key))
+
+    def _home(self, wordID):
+        # key id whose group the word's neighbors come from, -1 if no stressed syllable
+        if not self.wordkeys[wordID]:
+            return -1
+        return max(self.wordkeys[wordID], key=self._rank)
+
+    def _density(self, wordID):
+        home = self._home(wordID)
+        if home < 0:
+            return None
+        return len(self.members[home]) - 1
+
+    def add(self, word, syll=None, spans=None):
+        """
+
+        :param word: klattese form to add
+        :param syll: syllabified form, looked up in SyllableCache if not given
+        :param spans: SyllableSpans of the form, looked up in SyllableCache if not given
+        :return: dict[word] = new density of every word whose density changed,
+                 including the added word (None if it has no stressed syllable)
+        """
+        if syll is None or spans is None:
+            info = SyllableCache().lookup(word)
+            (syll, spans) = (info.boundaries, info.spans)
+        if word in self.ids:
+            return dict()
+        trims = list()
+        for position in spans.stresses:
+            pieces = spans.trim(position,self.simtype)
+            if pieces == "BROKEN":
+                print("more or less than one vowel: --",syll, spans.syllable(position),'-- define_similar_words -> trimsyllable')
+                pieces = ["BROKEN"]
+            trims.extend(pieces)
+        # only the words already in the new word's groups can change
+        affected = set()
+        for single in trims:
+            if single in self.keys:
+                affected.update(self.members[self.keys[single]])
+        before = dict((member, self._density(member)) for member in affected)
+        wordID = self.add_word(word, syll)
+        self.add_keys(wordID, trims)
+        changed = self._changes(before)
+        changed[word] = self._density(wordID)
+        return changed
+
+    def remove(self, word):
+        """
+
+        :param word: word to take out of the index
+        :return: dict[word] = new density of every word whose density changed,
+                 with None for the removed word
+        """
+        wordID = self.ids.pop(word)
+        affected = set()
+        for key in self.wordkeys[wordID]:
+            affected.update(self.members[key])
+        affected.discard(wordID)
+        before = dict((member, self._density(member)) for member in affected)
+        for key in self.wordkeys[wordID]:
+            del self.members[key][wordID]
+        self.wordkeys[wordID] = list()
+        self.words[wordID] = None
+        changed = self._changes(before)
+        changed[word] = None
+        return changed
+
+    def _changes(self, before):
+        # dict[word] = density, for the words of before whose density is no longer the same
+        changed = dict()
+        for member, density in before.items():
+            after = self._density(member)
+            if after != density:
+                changed[self.words[member]] = after
+        return changed
+
+    def densities(self):
+        # dict[word] = number of similar words; words without a stressed syllable are left out
+        densities = dict()
+        for wordID, word in enumerate(self.words):
+            if word is not None and self.wordkeys[wordID]:
+                densities[word] = self._density(wordID)
+        return densities
+
+    def neighbors(self, word=None):
+        # set of similar words of one word, or dict[word] = set for every word
+        if word is not None:
+            return self._neighbors(self.ids[word], word)
+        similar = dict()
+        for wordID, word in enumerate(self.words):
+            if word is not None and self.wordkeys[wordID]:
+                similar[word] = self._neighbors(wordID, word)
+        return similar
+
+    def graph(self):
+        # NeighborGraph over the indexed words, with the same neighbors as neighbors()
+        live = [wordID for wordID, word in enumerate(self.words) if word is not None]
+        newIDs = dict((wordID, newID) for newID, wordID in enumerate(live))
+        members = [[newIDs[member] for member in group] for group in self.members]
+        home = [self._home(wordID) for wordID in live]
+        return graph_from_groups([self.words[wordID] for wordID in live], home, members)
+
+    def _neighbors(self, wordID, word):
+        home = self._home(wordID)
+        if home < 0:
+            raise KeyError(word)
+        return set(self.syllabified[member] for member in self.members[home] if member != wordID)
 
-        return (o_n_similarity)
 
 class PhonemicSimilarity():
     ## traditional phoneme-based neighborhoods
@@ -133,93 +324,28 @@ class PhonemicSimilarity():
         self.phonwords = phonwords
         ## this assignment is useless. fix to make consistent with other
 
-    def findPhonemicSimilarity(self, lexList,stressFlag = False):
+    def findPhonemicSimilarity(self, lexList,stressFlag = False,jobs = 1,external = None):
         # finds define_similar_words on a list and returns a dict with word -> similarDict
         # WITHOUT the stress marking on the vowels if stressFlag == False
-        self.matchneighborhoods = defaultdict(dict)
-
-        for word in lexList:
-            if not stressFlag:
-                noStress = re.sub("1", "", word)
-                phonList = list(noStress)
-            else:
-                phonList = list(word)
-            self.addNeighborhood(phonList, word)
-        similar = self.assignSimilar(lexList)
-        similar = self.removeSelfSimilar(similar)
-        return similar
-
-    # ------------ used for finding segment-based neighbors
-
-    def addNeighborhood(self, wordList, phonWord):
-
-        # this code is NOT OPTIMIZED!!!!!
-        # I can go back and condense these loops foor better performance
-
-        self.matchneighborhoods[phonWord][phonWord] = 1
-        self.addition(wordList, phonWord)
-        self.deletion(wordList, phonWord)
-        self.substitution(wordList, phonWord)
-
-    def addition(self, wordList, phonWord):
-        # print "addition"
-        for x in range(0, len(wordList) + 1):
-            tempList = copy(wordList)
-            tempList.insert(x, "_")
-            newWord = "".join(tempList)
-            self.matchneighborhoods[newWord][phonWord] = 1
-            # print "ADD adding: ", newWord, "->",phonWord," =1"
-
-    def deletion(self, wordList, phonWord):
-        # print "deletion"
-        if not len(wordList) == 1:
-            numberList = copy(wordList)
-            for x in range(0, len(wordList)):
-                numberList[x] = str(x) + numberList[x]
-            for x in range(0, len(wordList)):
-                # print x, wordList
-                tempList = copy(numberList)
-                del tempList[x]
-                newWord = "".join(tempList)
-                self.matchneighborhoods[newWord][phonWord] = 1
-                # print "DELETE adding: ", newWord, "->",phonWord," =1"
-                # print newWord
-
-    def substitution(self, wordList, phonWord):
-        # print "substitution"
-        if not len(wordList) == 1:
-            for x in range(0, len(wordList)):
-                tempList = copy(wordList)
-                tempList[x] = "_"
-                newWord = "".join(tempList)
-                self.matchneighborhoods[newWord][phonWord] = 1
-                # print "SUB adding: ", newWord, "->",phonWord," =1"
-                # print newWord
-
-    def removeSelfSimilar(self, similar):
-        # this sub removes the instances where a word is a neighbor
-        # of itself, which inflates the neighbor count
-        for word, sims in similar.items():
-            sims.pop(word, "")
-        return similar
-
-    def assignSimilar(self, lexList):
-        # this sub takes the neighborhoods created previously and
-        # creates a dict with word -> dictSimilar
-
-        # create empty similar lexicon
-        sim = dict()
-        for word in lexList:
-            sim[word] = dict()
-
-        for k, v in self.matchneighborhoods.items():
-            if len(v) > 1:
-                for neighbor in v.keys():
-                    toUpdate = sim[neighbor]
-                    toUpdate.update(v)
-                    sim[neighbor] = toUpdate
-
-        return sim
+        # see neighborhood_index for how the one-edit neighbors are found; jobs > 1 runs it in a process pool
+        # and an ExternalBuild as external finds them on disk, for lexicons too large for memory
+        self.index = NeighborhoodIndex(lexList, stress=stressFlag, jobs=jobs, external=external)
+        return self.index.neighbors()
+
+    def findPhonemicDensity(self, lexList,stressFlag = False,jobs = 1,external = None):
+        # numpy array with the number of similar words of each word in lexList, in order
+        self.index = NeighborhoodIndex(lexList, stress=stressFlag, jobs=jobs, external=external)
+        return self.index.densities(lexList)
+
+    def findPhonemicDensities(self, lexList,jobs = 1,external = None):
+        # (with stress, without stress) numpy arrays of the number of similar words of each word in lexList
+        self.stress_index = StressNeighborhoods(lexList, jobs=jobs, external=external)
+        return self.stress_index.densities(lexList)
+
+    def findPhonemicGraph(self, lexList,stressFlag = False,jobs = 1,external = None):
+        # NeighborGraph of the similar words, with the words of lexList as vocabulary
+        self.index = NeighborhoodIndex(lexList, stress=stressFlag, jobs=jobs, external=external)
+        return self.index.graph()
 
 if __name__ == "__main__":
     TREMULOUS_BASE = "/home/melissa/Dropbox/experiments/"
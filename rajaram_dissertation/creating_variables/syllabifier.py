@@ -10,6 +10,19 @@
     CV_shape: when given a word in klattese, returns the consonant-vowel shape
     syllableStructure: when given a stress-marked word in klattese, returns
      the form with underscores marking syllable boundaries
+    syllabify_many: syllableStructure for a whole lexicon at once
+    syllable_spans: when given a word in klattese, returns a SyllableSpans
+     record: onset, nucleus and coda offsets of each syllable, which
+     syllables are stressed, and which nuclei are followed by /r/
+    SyllableCache: process-wide cache of the cv shape, number of syllables,
+     syllable boundaries and SyllableSpans of each word, with hit/miss
+     counters; every module that needs any of these reads them from it,
+     and rules_digest hashes the cluster tables for on-disk caches
+
+    The boundaries are placed in a single scan of each word. The split of
+    each consonant run between two nuclei is looked up in clusterSplits,
+    a table filled from twoCluster, threeCluster and the soft onset rules
+    the first time that run is seen.
 
     LAST EXAMINED: 8-23-18
     STATUS: probably not DRY, but usable
@@ -17,13 +30,119 @@
 
 """
 
-import re
+import hashlib
 import sys
+from collections import namedtuple
 from lexical_hairball.locations import Locations
 
 sys.path.append('/home/melissa/Dropbox/experiments/python/')
 
 
+# klattese vowels; everything else except the stress mark is a consonant
+VOWELS = "iIeE@aWY^cOoUuR|xX"
+STRESS = "1"
+
+
+# everything SyllableCache knows about one klattese form
+SyllableInfo = namedtuple('SyllableInfo', ['cv', 'syllables', 'boundaries', 'spans'])
+
+
+class _ShapeTable(dict):
+    # translation table for CVshape: vowels -> v, stress -> 1, anything else -> c
+    def __missing__(self, char):
+        return "c"
+
+
+SHAPE_TABLE = _ShapeTable((code, "c") for code in range(256))
+SHAPE_TABLE.update((ord(char), "v") for char in VOWELS)
+SHAPE_TABLE[ord(STRESS)] = STRESS
+
+
+class SyllableSpans(namedtuple('SyllableSpans', ['word', 'syllables', 'stresses', 'rcolored'])):
+    """ Syllable structure of one klattese form, as offsets into word.
+
+        syllables: (onset, nucleus, coda, end) for each syllable, so that
+                   word[onset:nucleus] is the onset, word[nucleus:coda] the
+                   vowel with its stress mark, and word[coda:end] the coda.
+                   A syllable without exactly one vowel has an empty nucleus.
+        stresses: indexes of the syllables that carry a stress mark
+        rcolored: for each syllable, whether /r/ directly follows the nucleus
+    """
+    __slots__ = ()
+
+    @property
+    def stressed(self):
+        # index of the first stressed syllable, -1 if none
+        if self.stresses:
+            return self.stresses[0]
+        return -1
+
+    def syllable(self, index):
+        (onset, nucleus, coda, end) = self.syllables[index]
+        return self.word[onset:end]
+
+    def trim(self, index, trimtype='onset-nucleus'):
+        """ Same pieces as SONSimilarity.trimSyllable, read off the offsets.
+
+        :param index: syllable to trim
+        :param trimtype: nucleus, onset-nucleus, nucleus-coda, onset-nucleus-coda
+               or onset-nucleus&nucleus-coda
+        :return: list of trimmed syllable pieces, or "BROKEN" when the
+                 syllable does not have exactly one vowel
+        """
+        (onset, nucleus, coda, end) = self.syllables[index]
+        if nucleus == coda:
+            return "BROKEN"
+        # a nucleus followed by /r/ keeps the /r/
+        if self.rcolored[index]:
+            coda += 1
+        if trimtype == 'nucleus':
+            return [self.word[nucleus:coda]]
+        elif trimtype == 'onset-nucleus':
+            return [self.word[onset:coda]]
+        elif trimtype == 'nucleus-coda':
+            return [self.word[nucleus:end]]
+        elif trimtype == 'onset-nucleus-coda':
+            return [self.word[onset:end]]
+        elif trimtype == 'onset-nucleus&nucleus-coda':
+            return [self.word[onset:coda], self.word[nucleus:end]]
+        else:
+            print('invalid syllable trim type',trimtype)
+            print('SyllableSpans->trim')
+            quit()
+
+
+def spans_from_boundaries(syllabified):
+    """
+
+    :param syllabified: klattese form with underscores at the syllable boundaries
+    :return: SyllableSpans of the form
+    """
+    word = syllabified.replace("_", "")
+    cvWord = word.translate(SHAPE_TABLE)
+    syllables = list()
+    stresses = list()
+    rcolored = list()
+    onset = 0
+    for text in syllabified.split("_"):
+        end = onset + len(text)
+        vowel = cvWord.find("v", onset, end)
+        if vowel >= 0 and cvWord.find("v", vowel + 1, end) < 0:
+            nucleus = vowel
+            coda = vowel + 1
+            if cvWord.startswith(STRESS, coda, end):
+                coda += 1
+        else:
+            nucleus = end
+            coda = end
+        if cvWord.find(STRESS, onset, end) >= 0:
+            stresses.append(len(syllables))
+        rcolored.append(nucleus < coda < end and word[coda] == "r")
+        syllables.append((onset, nucleus, coda, end))
+        onset = end
+    return SyllableSpans(word, tuple(syllables), tuple(stresses), tuple(rcolored))
+
+
 class Syllabifier:
     def __init__(self, stresstype):
         self.stressType = stresstype
@@ -36,6 +155,17 @@ class Syllabifier:
                            "kl": 1, "pr": 1, "fr": 1, "br": 1, "gr": 1, "pl": 1, "fl": 1, "bl": 1,
                            "gl": 1, "Sr": 1}
         self.threeCluster = {"spl": 1, "spr": 1, "str": 1, "skr": 1, "skw": 1, "sfr": 1}
+        # three consonants that are neither a cluster nor consonant + cluster:
+        # hardcoded onsets of the next syllable
+        self.softinitial = {"_lk","_nd","_nz","_ld","_nC","_rS","_rt","_rd","_rs","_nt","_ft",
+                            "_mp","_kt","_lz","_lt","_lp","_ks","_nJ"}
+        self.end_y = {"y"}
+        self.softfinal = {"_G"}
+
+        # state tables of the engine: character classes, and the split of
+        # every consonant run seen so far (filled in on first sight)
+        self.shapeTable = SHAPE_TABLE
+        self.clusterSplits = dict()
 
     def number_syllables(self, phonWord):
         """
@@ -43,9 +173,7 @@ class Syllabifier:
         :param phonWord: phonological form in klattese
         :return: an integer containing the number of syllables
         """
-        cvWord = self.CVshape(phonWord)
-        matches = re.findall("v", cvWord)
-        return len(matches)
+        return self.CVshape(phonWord).count("v")
 
     def CVshape(self, phonWord):
         """
@@ -53,161 +181,226 @@ class Syllabifier:
         :param phonWord: phonological form in klattese
         :return: a string containing c-v shape, i.e. k@t = CVC
         """
+        return phonWord.translate(self.shapeTable)
 
-        cvWord = re.sub("v", "q", phonWord)
-        cvWord = re.sub("[iIeE\@aWY\^cOoUuR\|xX]", "v", cvWord)
-        cvWord = re.sub("[^v1]", "c", cvWord)
-        return cvWord
-
-    def syllableStructure(self, phonWord, cvWord):
+    def syllableStructure(self, phonWord, cvWord=None):
         """
 
         :param phonWord: phonological form in klattese, may contain stress marking
-        :param cvWord: cv shape of phonological form
+        :param cvWord: cv shape of phonological form; no longer needed, the
+               shape is found in the same scan as the boundaries
         :return: string containing phonological form with syllable boundaries marked
                  with underscores
         """
+        return self.syllabify(phonWord)
 
-        def initial_boundaries():
-            """
-
-            :return: returns 'naive' syllable boundaries
-            """
-            # add a syllable boundary after each stressed or unstressed vowel
-            maxsylcv = re.sub("v1", "q", cvWord)
-            maxsylcv = re.sub("v", "v_", maxsylcv)
-            maxsylcv = re.sub("q", "q_", maxsylcv)
-            maxsylcv = re.sub("q", "v1", maxsylcv)
-            lastScore = maxsylcv.rfind("_")
-            maxsylcv = maxsylcv[:lastScore] + maxsylcv[lastScore + 1:]
-            matches = re.finditer("_", maxsylcv)
-            maxPhonSyl = phonWord
-            # puts the syllable boundaries in the analogous position of the phonword
-            for position in matches:
-                maxPhonSyl = maxPhonSyl[:position.start()] + "_" + maxPhonSyl[position.start():]
-            return maxPhonSyl
-
-        def adjust_boundary(prior):
-            """
-
-            :param prior: string with boundaries to be adjusted
-                   match: contains boundary start and end to adjust
-            :return: string with adjusted boundary
-            """
-            bs = match.span()[0]  # boundary start
-            be = match.span()[1]  # boundary end
-            before = prior[:bs]
-            middle = prior[bs:be]
-            end = prior[be:]
-            new = before + newOrder + end
-            return new
+    def syllable_spans(self, phonWord):
+        """
 
-        self.errorflag = False
-        maxPhonSyl = initial_boundaries()
-        # compile to find all possible consonants before vowel
-        p = re.compile('_[^iIeE\@aWY\^cOoUuR\|xX1]+')
-        consonants = p.finditer(maxPhonSyl)
-        for match in consonants:
-            lenMatch = len(match.group())
-            if lenMatch == 3:  #boundary and two consonants
-                if not match.group()[1:3] in self.twoCluster:
-                    # if not a two-cluster, move boundary in between consonants
-                    newOrder = match.group()[1:2] + "_" + match.group()[2:3]
-                    maxPhonSyl = adjust_boundary(maxPhonSyl)
-                else:
-                    # print for examples
-                    #print(maxPhonSyl)
-                    pass
-
-            elif lenMatch == 4:  # boundary and three consonants
-                #self.errorflag = True
-                if not match.group()[1:4] in self.threeCluster:
-                    # if not a three-cluster, test if consonant + two-cluster
-                    if match.group()[2:4] in self.twoCluster: # second two are a valid cluster
-                        #self.errorflag = True
-                        newOrder = match.group()[1:2] + "_" + match.group()[2:4]
-                        maxPhonSyl = adjust_boundary(maxPhonSyl)
-                        #print(maxPhonSyl)
-
-                    elif match.group()[1:3] in self.twoCluster: # first two are a  valid cluster
-                        #self.errorflag = True
-                        newOrder = match.group()[1:3] + "_" + match.group()[3:4]
-                        maxPhonSyl = adjust_boundary(maxPhonSyl)
-                        #print(maxPhonSyl)
-                        ## note, nothing prints here
-
-                    else:
-                        #self.errorflag = True
-                        # does not contain three-cluster or two-cluster: hardcode solution
-                        softinitial = {"_lk","_nd","_nz","_ld","_nC","_rS","_rt","_rd","_rs","_nt","_ft",
-                                       "_mp","_kt","_lz","_lt","_lp","_ks","_nJ"}
-                        end_y = {"y"}
-                        softfinal = {"_G"}
-                        if match.group()[0:3] in softinitial:
-                            # treat like lk is a cluster
-                            newOrder = match.group()[1:3] + "_" + match.group()[3:4]
-                            maxPhonSyl = adjust_boundary(maxPhonSyl)
-                            #print(maxPhonSyl)
-
-                        elif match.group()[3:4] in end_y:
-                            #self.errorflag = True
-                            newOrder = match.group()[1:2] + "_" + match.group()[2:4]
-                            maxPhonSyl = adjust_boundary(maxPhonSyl)
-                            #print(maxPhonSyl)
-
-                        elif match.group()[0:2] in softfinal:
-                            #self.errorflag = True
-                            newOrder = match.group()[1:2] + "_" + match.group()[2:4]
-                            maxPhonSyl = adjust_boundary(maxPhonSyl)
-                            #print(maxPhonSyl)
-
-                        else:
-                            self.errorflag = True
-                            print('GO AND FIX:',maxPhonSyl,match.group())
-                else:
-                    # has three cluster, for illustrating
-                    #print(maxPhonSyl)
-                    pass
+        :param phonWord: phonological form in klattese, may contain stress marking
+        :return: SyllableSpans record of the syllabified form
+        """
+        return spans_from_boundaries(self.syllabify(phonWord))
 
-            elif lenMatch > 4:  # boundary and 4 or more consonants
+    def syllabify_many(self, phonWords):
+        """
 
-                if match.group()[lenMatch - 3:lenMatch] in self.threeCluster:
-                    newOrder = match.group()[1:lenMatch - 3] + "_" + match.group()[lenMatch - 3:lenMatch]
-                    maxPhonSyl = adjust_boundary(maxPhonSyl)
-                    #print(maxPhonSyl)
+        :param phonWords: iterable of phonological forms, e.g. a whole lexicon
+        :return: list of syllabified forms in the same order; the cluster
+                 table is shared across the batch
+        """
+        return [self.syllabify(phonWord) for phonWord in phonWords]
+
+    def syllabify(self, phonWord):
+        """ Places the syllable boundaries in one scan of the word.
 
-                elif match.group()[lenMatch - 2:lenMatch] in self.twoCluster:
-                    newOrder = match.group()[1:lenMatch - 2] + "_" + match.group()[lenMatch - 2:lenMatch]
-                    maxPhonSyl = adjust_boundary(maxPhonSyl)
-                    #print(maxPhonSyl)
-                    # none printed for child, some in adult
+            A boundary follows each vowel (and its stress mark) except the
+            last; the consonants after it are split by clusterSplits. This
+            gives the same boundaries as placing naive boundaries and then
+            adjusting each consonant run, as the earlier regex version did.
 
+        :param phonWord: phonological form in klattese, may contain stress marking
+        :return: string containing phonological form with syllable boundaries marked
+                 with underscores
+        """
+        self.errorflag = False
+        # the cv shape classifies every character in one pass; vowels and
+        # nucleus ends are then found with str.find over it
+        cvWord = phonWord.translate(self.shapeTable)
+        vowels = list()
+        nuclei = list()
+        position = cvWord.find("v")
+        while position >= 0:
+            vowels.append(position)
+            if cvWord.startswith(STRESS, position + 1):
+                nuclei.append(position + 2)
+            else:
+                nuclei.append(position + 1)
+            position = cvWord.find("v", position + 1)
+        if len(nuclei) < 2:
+            return phonWord
+
+        pieces = list()
+        cuts = list()
+        previous = 0
+        for syllable in range(len(nuclei) - 1):
+            nucleusEnd = nuclei[syllable]
+            # consonant run up to the next vowel or stress mark
+            runEnd = cvWord.find(STRESS, nucleusEnd, vowels[syllable + 1])
+            if runEnd < 0:
+                runEnd = vowels[syllable + 1]
+            run = phonWord[nucleusEnd:runEnd]
+            if run in self.clusterSplits:
+                (split, replacement) = self.clusterSplits[run]
+            else:
+                (split, replacement) = self.split_cluster(run)
+            if split is None:
+                # left where the naive boundary put it
+                self.report_broken(phonWord, cuts, nuclei[syllable:-1], run)
+                (split, replacement) = (0, None)
+            cuts.append(nucleusEnd + split)
+            if replacement is None:
+                replacement = run[:split] + "_" + run[split:]
+
+            # R-COLORED VOWELS
+            # ensures that /r/ following stressed vowel is not broken by syllable boundary,
+            # and that the unstressed 'er' is not broken by a syllable boundary
+            if replacement[split + 1:split + 2] == "r":
+                if split > 0:
+                    before = replacement[split - 1]
+                else:
+                    before = phonWord[nucleusEnd - 1]
+                if before == STRESS or before == "E":
+                    replacement = replacement[:split] + "r_" + replacement[split + 2:]
+
+            pieces.append(phonWord[previous:nucleusEnd])
+            pieces.append(replacement)
+            previous = runEnd
+        pieces.append(phonWord[previous:])
+        return "".join(pieces)
+
+    def split_cluster(self, run):
+        """ Works out where the boundary goes in a run of consonants, and
+            stores it in clusterSplits.
+
+        :param run: consonants between a nucleus and the next vowel
+        :return: (consonants kept before the boundary, replacement text for
+                 boundary + run, or None); the split is None for a run that
+                 cannot be syllabified
+        """
+        decision = (0, None)
+        length = len(run)
+        if length == 2:  # boundary and two consonants
+            if not run in self.twoCluster:
+                # if not a two-cluster, move boundary in between consonants
+                decision = (1, None)
+
+        elif length == 3:  # boundary and three consonants
+            if not run in self.threeCluster:
+                # if not a three-cluster, test if consonant + two-cluster
+                if run[1:3] in self.twoCluster:  # second two are a valid cluster
+                    decision = (1, None)
+                elif run[0:2] in self.twoCluster:  # first two are a  valid cluster
+                    decision = (2, None)
+                # does not contain three-cluster or two-cluster: hardcode solution
+                elif "_" + run[0:2] in self.softinitial:
+                    # treat like lk is a cluster
+                    decision = (2, None)
+                elif run[2:3] in self.end_y:
+                    decision = (1, None)
+                elif "_" + run[0:1] in self.softfinal:
+                    decision = (1, None)
                 else:
-                    if match.group() in self.fixbroken:
-                        #print(maxPhonSyl)
-                        maxPhonSyl = maxPhonSyl.replace(match.group(),self.fixbroken[match.group()])
-                        #print('fixed',maxPhonSyl)
-                    else:
-                        print('SYLLABIFIER ERROR:', match.group(), 'in' , maxPhonSyl)
-                        if not match.group() in self.brokensylls:
-                            newset = set()
-                            newset.add(maxPhonSyl)
-                            self.brokensylls[match.group()] = newset
-                        else:
-                            wordset = self.brokensylls[match.group()]
-                            wordset.add(maxPhonSyl)
-                            self.brokensylls[match.group()] = wordset
-
-        # R-COLORED VOWELS
-        # ensures that /r/ following stressed vowel is not broken by syllable boundary
-        if "1_r" in maxPhonSyl:
-            maxPhonSyl = maxPhonSyl.replace('1_r','1r_')
-
-        # ensures the unstressed 'er' is not broken by a syllable boundary
-        if 'E_r' in maxPhonSyl:
-            maxPhonSyl = maxPhonSyl.replace('E_r', 'Er_')
-
-        return maxPhonSyl
+                    decision = (None, None)
+
+        elif length > 3:  # boundary and 4 or more consonants
+            if run[length - 3:] in self.threeCluster:
+                decision = (length - 3, None)
+            elif run[length - 2:] in self.twoCluster:
+                decision = (length - 2, None)
+            elif "_" + run in self.fixbroken:
+                fixed = self.fixbroken["_" + run]
+                decision = (fixed.index("_"), fixed)
+            else:
+                decision = (None, None)
+
+        if decision[0] is None:
+            # errors are reported for every word, so they are not stored
+            return decision
+        self.clusterSplits[run] = decision
+        return decision
+
+    def report_broken(self, phonWord, cuts, naive, run):
+        # prints a run that could not be syllabified, with the boundaries
+        # adjusted so far and the naive ones still to come
+        current = list(phonWord)
+        for cut in reversed(cuts + naive):
+            current.insert(cut, "_")
+        current = "".join(current)
+        if len(run) == 3:
+            self.errorflag = True
+            print('GO AND FIX:', current, "_" + run)
+        else:
+            print('SYLLABIFIER ERROR:', "_" + run, 'in', current)
+            if not "_" + run in self.brokensylls:
+                self.brokensylls["_" + run] = set()
+            self.brokensylls["_" + run].add(current)
+
+
+class SyllableCache():
+    """ Syllabification results shared by every user in the process.
+
+        Keyed by klattese form; each entry is a SyllableInfo holding the cv
+        shape, the number of syllables, the form with underscores at the
+        syllable boundaries and its SyllableSpans. Every instance reads and fills the same
+        class-level store and counters.
+    """
+
+    entries = dict()
+    hits = 0
+    misses = 0
+    syllabifier = None
+
+    def lookup(self, phonWord):
+        """
+
+        :param phonWord: phonological form in klattese, may contain stress marking
+        :return: SyllableInfo for the form, syllabified on first use
+        """
+        info = SyllableCache.entries.get(phonWord)
+        if info is None:
+            SyllableCache.misses += 1
+            cvWord = self.shared_syllabifier().CVshape(phonWord)
+            boundaries = SyllableCache.syllabifier.syllabify(phonWord)
+            info = SyllableInfo(cvWord, cvWord.count("v"), boundaries, spans_from_boundaries(boundaries))
+            SyllableCache.entries[phonWord] = info
+        else:
+            SyllableCache.hits += 1
+        return info
+
+    def shared_syllabifier(self):
+        # the Syllabifier every instance uses, made on first use
+        if SyllableCache.syllabifier is None:
+            SyllableCache.syllabifier = Syllabifier('STRESS')
+        return SyllableCache.syllabifier
+
+    def rules_digest(self):
+        # hash of the cluster tables the boundaries come from, for caches of anything built on them
+        syllabifier = self.shared_syllabifier()
+        digest = hashlib.sha1()
+        for table in (syllabifier.twoCluster, syllabifier.threeCluster, syllabifier.softinitial,
+                      syllabifier.fixbroken, syllabifier.end_y, syllabifier.softfinal):
+            digest.update(repr(sorted(table.items()) if isinstance(table, dict) else sorted(table)).encode())
+        digest.update(syllabifier.stressType.encode())
+        return digest.hexdigest()
+
+    def lookup_many(self, phonWords):
+        # SyllableInfo for each form of a lexicon, in the same order
+        return [self.lookup(phonWord) for phonWord in phonWords]
+
+    def print_stats(self):
+        print('syllable cache:', len(SyllableCache.entries), 'words,',
+              SyllableCache.hits, 'hits,', SyllableCache.misses, 'misses')
 
 
 if __name__ == "__main__":
@@ -44,6 +44,8 @@ class Locations():
         ## TOOLS: FILES USED
         self.closed_class = self.mybase + "resources/part_of_speech/closed_class/attachment.txt"
         self.cmutranslator = self.mybase + "resources/cmu_dictionary/cmudict.0.7a"
+        self.cmu_compiled = self.mybase + "resources/cmu_dictionary/compiled/"
+        self.neighborhood_cache = self.mybase + "python/data/rajaram_dissertation/neighborhoods/"
         self.moby_pos = self.mybase + "resources/part_of_speech/mpos/mobypos.txt"
         self.english_lexicon_project = self.mybase + "resources/english_lexicon_project/elp_everything.csv"
 
@@ -0,0 +1,120 @@
+""" Loads the shared language resources used in Melissa Rajaram's dissertation
+
+    Each resource (CMU dictionary, orthographic -> klattese translator,
+    Moby and ELP part of speech, closed class words) is loaded at most
+    once per process, and only the first time it is asked for. The time
+    and memory used by each load are kept so that startup cost can be
+    printed.
+
+    Examples:
+
+        $ python resource_registry.py
+            When run from the command line, loads every resource and
+            prints the load report.
+
+        phon = ResourceRegistry().phonological
+            When called from other modules, returns the shared resource,
+            loading it first if no other module has asked for it yet.
+
+    NOTE: memory is measured as the growth of the process's resident set
+    over the load (from /proc/self/statm, or the peak resident set where
+    that is missing), so nothing is traced and loads run at full speed.
+    Pages of the memory-mapped CMU index count once they are read, and
+    memory freed back to python but not to the system still counts. A
+    resource that loads another resource for the first time includes that
+    load in its own numbers.
+
+"""
+import os
+import resource
+import time
+
+
+class ResourceRegistry():
+    """ Only class in module; see header for complete documentation """
+
+    # class level, so that every instance shares the loaded resources
+    loaded = dict()
+    load_report = dict()
+
+    def get(self, name):
+        """
+
+        :param name: one of cmu, phonological, moby_pos, elp_pos, closed_class
+        :return: the resource, loaded on first use
+        """
+        if not name in ResourceRegistry.loaded:
+            loader = getattr(self, 'load_' + name)
+            before = resident_memory()
+            start = time.perf_counter()
+            loaded = loader()
+            seconds = time.perf_counter() - start
+            held = max(resident_memory() - before, 0)
+            ResourceRegistry.loaded[name] = loaded
+            ResourceRegistry.load_report[name] = (seconds, held)
+        return ResourceRegistry.loaded[name]
+
+    # imports are inside the loaders so that unused resources are never imported
+
+    def load_cmu(self):
+        from completed_projects.rajaram_dissertation.transcript_processing.word_transformation.cmutranslator.cmutranslator import CMUTranslator
+        return CMUTranslator("STRESS")
+
+    def load_phonological(self):
+        from completed_projects.rajaram_dissertation.transcript_processing.word_transformation.transform_orth_to_klattese import \
+            PhonologicalFromOrthographic
+        return PhonologicalFromOrthographic()
+
+    def load_moby_pos(self):
+        from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.mobypos import MobyPOS
+        return MobyPOS()
+
+    def load_elp_pos(self):
+        from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.elp_pos import EnglishLexiconProjectPOS
+        return EnglishLexiconProjectPOS()
+
+    def load_closed_class(self):
+        from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.closed_class import ClosedClass
+        return ClosedClass()
+
+    @property
+    def cmu(self):
+        return self.get('cmu')
+
+    @property
+    def phonological(self):
+        return self.get('phonological')
+
+    @property
+    def moby_pos(self):
+        return self.get('moby_pos')
+
+    @property
+    def elp_pos(self):
+        return self.get('elp_pos')
+
+    @property
+    def closed_class(self):
+        return self.get('closed_class')
+
+    def print_load_report(self):
+        for name, (seconds, held) in ResourceRegistry.load_report.items():
+            print('loaded', name, 'in', round(seconds, 3), 's, holding', round(held / 2 ** 20, 1), 'MB')
+
+
+def resident_memory():
+    # bytes of the process's resident set, or its peak where /proc is not available
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+if __name__ == "__main__":
+    # see file header for usage examples
+    REGISTRY = ResourceRegistry()
+    for NAME in ['cmu', 'phonological', 'moby_pos', 'elp_pos', 'closed_class']:
+        REGISTRY.get(NAME)
+    REGISTRY.print_load_report()
@@ -0,0 +1,30 @@
+""" The SON entries LexiconUnion caches must be rebuilt after the syllabifier's tables change """
+import os
+
+from completed_projects.rajaram_dissertation.creating_variables.lexicon_union import LexiconUnion
+from completed_projects.rajaram_dissertation.creating_variables.neighborhood_cache import NeighborhoodCache
+from completed_projects.rajaram_dissertation.creating_variables.syllabifier import SyllableCache
+
+LEXICONS = {'child': ['ka1t', 'ba1t', 'ka1ksky', 'mI1st'], 'adult': ['ka1t', 'ka1tIG', 'mI1st']}
+
+
+def son_builds(directory):
+    # number of SON entry sets saved in the cache directory
+    return len([name for name in os.listdir(directory) if name.startswith('son_')])
+
+
+def test_fixbroken_edit_misses_son_cache(tmp_path):
+    cache = NeighborhoodCache(str(tmp_path))
+    LexiconUnion(LEXICONS, cache=cache).son_entries('onset-nucleus')
+    LexiconUnion(LEXICONS, cache=cache).son_entries('onset-nucleus')
+    assert son_builds(tmp_path) == 1
+
+    fixbroken = SyllableCache().shared_syllabifier().fixbroken
+    saved = dict(fixbroken)
+    fixbroken['_ksky'] = 'ks_ky'
+    try:
+        LexiconUnion(LEXICONS, cache=cache).son_entries('onset-nucleus')
+        assert son_builds(tmp_path) == 2
+    finally:
+        fixbroken.clear()
+        fixbroken.update(saved)
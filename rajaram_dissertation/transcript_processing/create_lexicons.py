@@ -22,9 +22,8 @@
 from collections import defaultdict
 
 from completed_projects.rajaram_dissertation.locations import Locations
+from completed_projects.rajaram_dissertation.resource_registry import ResourceRegistry
 from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.word_eval import WordEvaluation
-from completed_projects.rajaram_dissertation.transcript_processing.word_transformation.transform_orth_to_klattese import \
-    PhonologicalFromOrthographic
 
 
 class CreateLexicons():
@@ -37,7 +36,10 @@ class CreateLexicons():
         self.loc = Locations()
         self.we = WordEvaluation()
         self.we.load_evaluated_words()
-        self.phon = PhonologicalFromOrthographic()
+        # same translator as self.we.phon; only loaded once per process
+        self.phon = ResourceRegistry().phonological
+        # orthographic form -> TranslationProblem, across all six lexicons
+        self.translation_problems = dict()
 
         # number of transcripts at each age
         self.n3 = 747
@@ -84,6 +86,8 @@ class CreateLexicons():
 
         newlex = defaultdict(dict)
 
+        # (form to translate, orthographic label, token, pctchild, nchild) for each kept line
+        kept = list()
         f = open(rwl_file, "r")
         f.readline()
         for line in f.readlines():
@@ -95,21 +99,24 @@ class CreateLexicons():
             nchild = int(wordInfo[1])
             if orth in self.we.keep_as_is:
                 # translate to phonological from orthographic
-                word = self.phon.orth_to_phon(orth)
-                add_token()
+                kept.append((orth, orth, token, pctchild, nchild))
             elif orth in self.we.keep_to_root:
                 # reduce orthographic form to root word, then
                 # translate to phonological
-                word = self.phon.orth_to_phon(self.we.inflect_to_root[orth])
-                orth = self.we.inflect_to_root[orth] + ':' + orth
-                add_token()
+                root = self.we.inflect_to_root[orth]
+                kept.append((root, root + ':' + orth, token, pctchild, nchild))
             elif orth in self.we.remove_not_representative:
                 # do nothing because word is not representative
                 pass
-
-
         f.close()
 
+        # all lines of the file are translated in one batch
+        (phonwords, problems) = self.phon.translate_many(entry[0] for entry in kept)
+        for problem in problems:
+            self.translation_problems[problem.word] = problem
+        for word, (_, orth, token, pctchild, nchild) in zip(phonwords, kept):
+            add_token()
+
         return newlex
 
 
@@ -123,4 +130,6 @@ if __name__ == "__main__":
     print('adult 3: ',len(TEST_CASE.adult3))
     print('adult 4: ',len(TEST_CASE.adult4))
     print('adult 6: ',len(TEST_CASE.adult6))
+    print('words with translation problems: ',len(TEST_CASE.translation_problems))
+    ResourceRegistry().print_load_report()
 
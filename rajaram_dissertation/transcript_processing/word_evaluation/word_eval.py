@@ -12,11 +12,7 @@
 import numpy as np
 import pandas as pd
 import sklearn.metrics as skmet
-from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.elp_pos import EnglishLexiconProjectPOS
-from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.mobypos import MobyPOS
-from completed_projects.rajaram_dissertation.transcript_processing.word_transformation.transform_orth_to_klattese import \
-    PhonologicalFromOrthographic
-from completed_projects.rajaram_dissertation.transcript_processing.word_evaluation.closed_class import ClosedClass
+from completed_projects.rajaram_dissertation.resource_registry import ResourceRegistry
 from completed_projects.rajaram_dissertation.locations import Locations
 
 
@@ -29,18 +25,32 @@ class WordEvaluation:
 
         """
         self.l = Locations()
-        self.phon = PhonologicalFromOrthographic()
-        self.mobypos = MobyPOS(self.l.mybase)
+        # translator and POS resources are loaded on first use, see properties below
+        self.resources = ResourceRegistry()
         self.mremove = list(['Conjunction', 'Interjection', 'Pronoun',
                         'Preposition', 'Definite Article', 'Indefinite Article'])
-        self.elppos = EnglishLexiconProjectPOS()
-        self.closed = ClosedClass()
 
         self.keep_as_is = set()
         self.remove_not_representative = set()
         self.keep_to_root = set()
         self.inflect_to_root = dict()
 
+    @property
+    def phon(self):
+        return self.resources.phonological
+
+    @property
+    def mobypos(self):
+        return self.resources.moby_pos
+
+    @property
+    def elppos(self):
+        return self.resources.elp_pos
+
+    @property
+    def closed(self):
+        return self.resources.closed_class
+
     def mobyeval(self,word):
         if word in self.mobypos.mobypos:
             moby = self.mobypos.mobypos[word]
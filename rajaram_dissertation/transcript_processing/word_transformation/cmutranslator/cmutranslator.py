@@ -11,67 +11,318 @@
 	    - ORTH_TO_PHON: orthographic to phonological
 	    - PHON_TO_ORTH: phonological to orthographic
 
+    INDEXES:
+        Both directions are loaded from a single pass over the file.
+        - orthToPhon: word -> tuple of every klattese pronunciation, with
+          variant entries such as WORD(2) folded into WORD in file order
+        - phonToOrth: klattese -> tuple of every spelling, so homophones
+          are all kept
+        - CMUDict: the direction asked for in the constructor; as in the
+          old line-by-line dict, ORTH_TO_PHON keys point to the first
+          entry of their tuple and PHON_TO_ORTH keys to the last, the one
+          the last line of the file wrote
+        The number of primary stress marks ('1') of every string is stored
+        with it, so orthToPhon.stressCounts() gives the count of each
+        word's first pronunciation without reading the pronunciations.
+
+    COMPILED DICTIONARY:
+        The first time a stress type is requested, both indexes are
+        written to Locations().cmu_compiled as one binary file. Every
+        orthographic and klattese string is stored once in a shared pool,
+        and the two indexes hold only positions in that pool, stored as
+        utf-8 (whose byte order is the order of the strings). The file
+        name carries a hash of the path, size and modification time of
+        the CMU dictionary and of the ARPAbet -> klattese table, so
+        editing either one forces a rebuild without either being read
+        on later runs. Every later run memory-maps the file, and lookups
+        binary-search the mapped entries directly.
+
 	LAST EXAMINED: 10-07-18
 	LAST CODED: unknown
     STATUS: - frequently used across projects
             - works as desired
+            - CMUDict no longer has the variant keys (word(2) etc.): they
+              are folded into word, in both directions
 
 
 
  """
 
-import re
+import hashlib
+import mmap
+import os
+import struct
+from collections.abc import ItemsView, Mapping
+
+import numpy as np
 from completed_projects.rajaram_dissertation.locations import Locations
 
+# layout of the compiled file: header, string pool offsets, the
+# orth -> phon index, the phon -> orth index, the stress count of each
+# string, then the string pool
+COMPILED_MAGIC = b"CMUK"
+COMPILED_VERSION = 4
+HEADER = struct.Struct("<4sIIIIII")
+
 
 class CMUTranslator():
     def __init__(self, stressType, dictDirection="ORTH_TO_PHON"):
         self.l = Locations()
         self.myBASE = self.l.mybase
         self.stressType = stressType
-        self.CMUDict = {}
         self.arpaToKlatt = {}
         self.loadArpaToKlatt()
         # print "loading CMU Pronounciation dict"
-        self.translateDictToKlatt(dictDirection)
+        compiled = self.loadCompiledDict()
         # print "finished loading dict."
+        self.orthToPhon = compiled.orthToPhon
+        self.phonToOrth = compiled.phonToOrth
+        if dictDirection == "PHON_TO_ORTH":
+            self.CMUDict = self.phonToOrth.last()
+        elif dictDirection == "ORTH_TO_PHON":
+            self.CMUDict = self.orthToPhon.first()
+        else:
+            print("bad dict direction, quitting")
+            quit()
 
-    def loadArpaToKlatt(self):
+    def arpaToKlattFile(self):
         if self.stressType == "NAIVE":
-            aToKFile = self.myBASE + "python/lexical_hairball/tools/cmutranslator/cmudict_symbols_klatt.txt"
+            return self.myBASE + "python/lexical_hairball/tools/cmutranslator/cmudict_symbols_klatt.txt"
         elif self.stressType == "STRESS":
-            aToKFile = self.myBASE + "python/lexical_hairball/tools/cmutranslator/arpa_klatt_stress.txt"
+            return self.myBASE + "python/lexical_hairball/tools/cmutranslator/arpa_klatt_stress.txt"
         else:
             print("Invalid stress type, no file selected, program will die.")
             quit()
-        f = open(aToKFile, "r")
+
+    def loadArpaToKlatt(self):
+        f = open(self.arpaToKlattFile(), "r")
         aToKLines = f.readlines()
         f.close()
         for line in aToKLines:
             # print line.split()[0] + " to " + line.split()[1].strip()
             self.arpaToKlatt[line.split()[0]] = line.split()[1].strip()
 
-    def translateDictToKlatt(self, dictDirection):
+    def compiledPath(self):
+        # the compiled file is named by everything that can change its contents
+        digest = hashlib.sha1()
+        digest.update(str(COMPILED_VERSION).encode())
+        for source in (self.l.cmutranslator, self.arpaToKlattFile()):
+            status = os.stat(source)
+            digest.update(("|" + os.path.abspath(source) + "|" + str(status.st_size) + "|" +
+                           str(status.st_mtime_ns)).encode())
+        name = "cmudict_" + self.stressType + "_" + digest.hexdigest()[:16] + ".bin"
+        return os.path.join(self.l.cmu_compiled, name)
+
+    def loadCompiledDict(self):
+        path = self.compiledPath()
+        if not os.path.exists(path):
+            (orthToPhon, phonToOrth) = self.translateDictToKlatt()
+            writeCompiledDict(orthToPhon, phonToOrth, path)
+        return CompiledCMUDict(path)
+
+    def translateDictToKlatt(self):
+        # returns (orth -> [phon, ...], phon -> [orth, ...]) from one pass over the file
+        orthToPhon = dict()
+        phonToOrth = dict()
         CMUFile = self.l.cmutranslator
         f = open(CMUFile, "r")
-        CMULines = f.readlines()
-        f.close()
-        for line in CMULines:
-            if not re.search(";", line):
-                phonetic = self.getKlattFromArpa(line.split("  ")[1].strip())
+        for line in f:
+            if not ";" in line:
+                pieces = line.split("  ")
+                phonetic = self.getKlattFromArpa(pieces[1].strip())
+                orth = baseSpelling(pieces[0].lower())
                 # print line.split("  ")[0].lower() + " to " + phonetic
-                if dictDirection == "PHON_TO_ORTH":
-                    self.CMUDict[phonetic] = line.split("  ")[0].lower()
-                elif dictDirection == "ORTH_TO_PHON":
-                    self.CMUDict[line.split("  ")[0].lower()] = phonetic
-                else:
-                    print("bad dict direction, quitting")
-                    quit()
+                pronunciations = orthToPhon.setdefault(orth, list())
+                if not phonetic in pronunciations:
+                    pronunciations.append(phonetic)
+                spellings = phonToOrth.setdefault(phonetic, list())
+                if not orth in spellings:
+                    spellings.append(orth)
+        f.close()
+        return (orthToPhon, phonToOrth)
 
     def getKlattFromArpa(self, arpaWord):
-        phonetic = ""
-        # print "arpa: " + arpaWord
-        for phoneme in arpaWord.split():
-            phonetic = phonetic + self.arpaToKlatt[phoneme]
-            # print phonetic
-        return phonetic
+        return "".join([self.arpaToKlatt[phoneme] for phoneme in arpaWord.split()])
+
+
+def baseSpelling(orth):
+    # folds variant entries, e.g. word(2) -> word
+    if orth.endswith(")") and "(" in orth:
+        paren = orth.rindex("(")
+        if orth[paren + 1:-1].isdigit():
+            return orth[:paren]
+    return orth
+
+
+def writeCompiledDict(orthToPhon, phonToOrth, path):
+    # serializes both str -> [str] dicts over one sorted string pool, so
+    # that CompiledCMUDict can search them without parsing
+
+    strings = set(orthToPhon)
+    strings.update(phonToOrth)
+    strings = sorted(string.encode("utf-8") for string in strings)
+    stringID = dict()
+    offsets = list()
+    pool = bytearray()
+    for string in strings:
+        stringID[string.decode("utf-8")] = len(offsets)
+        offsets.append(len(pool))
+        pool += string
+    offsets.append(len(pool))
+
+    def pack_index(index):
+        # keys are listed in pool order, which is sorted order
+        keys = sorted(stringID[key] for key in index)
+        starts = [0]
+        values = list()
+        for key in keys:
+            values.extend(stringID[value] for value in index[strings[key].decode("utf-8")])
+            starts.append(len(values))
+        return (keys, starts, values)
+
+    sections = list()
+    for index in (orthToPhon, phonToOrth):
+        sections.extend(pack_index(index))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # written under a temporary name so that a half written index is never mapped
+    temp = path + "." + str(os.getpid()) + ".tmp"
+    f = open(temp, "wb")
+    f.write(HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, len(strings),
+                        len(sections[0]), len(sections[2]), len(sections[3]), len(sections[5])))
+    for section in [offsets] + sections:
+        f.write(struct.pack("<%dI" % len(section), *section))
+    f.write(bytes(min(string.count(b"1"), 255) for string in strings))
+    f.write(pool)
+    f.close()
+    os.replace(temp, path)
+
+
+class CompiledCMUDict():
+    """ Memory-mapped file from writeCompiledDict.
+
+        Holds the shared string pool and exposes the two indexes over it
+        as orthToPhon and phonToOrth.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        f = open(path, "rb")
+        self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        (magic, version, nStrings, nOrth, nOrthValues, nPhon, nPhonValues) = HEADER.unpack_from(self._mm, 0)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION:
+            raise ValueError("not a compiled CMU dictionary: " + path)
+
+        self._position = HEADER.size
+
+        def section(length):
+            start = self._position
+            self._position += 4 * length
+            return memoryview(self._mm)[start:self._position].cast("I")
+
+        self._offsets = section(nStrings + 1)
+        self.orthToPhon = CompiledIndex(self, section(nOrth), section(nOrth + 1), section(nOrthValues))
+        self.phonToOrth = CompiledIndex(self, section(nPhon), section(nPhon + 1), section(nPhonValues))
+        self.stress = np.frombuffer(self._mm, dtype=np.uint8, count=nStrings, offset=self._position)
+        self._pool = self._position + nStrings
+
+    def string(self, stringID):
+        return self._mm[self._pool + self._offsets[stringID]:self._pool + self._offsets[stringID + 1]]
+
+
+class CompiledIndex(Mapping):
+    """ Read-only dict of str -> tuple of str over a CompiledCMUDict.
+
+        Keys are kept in sorted order, so a lookup is a binary search
+        over the mapped entries; nothing is read into memory up front.
+    """
+
+    def __init__(self, compiled, keys, starts, values, only=None):
+        self._compiled = compiled
+        self._keys = keys
+        self._starts = starts
+        self._values = values
+        # "first" or "last" to map each key to that entry alone, None for the whole tuple
+        self._only = only
+
+    def first(self):
+        # same index, with each key pointing to the first entry only
+        return CompiledIndex(self._compiled, self._keys, self._starts, self._values, "first")
+
+    def last(self):
+        # same index, with each key pointing to the last entry only
+        return CompiledIndex(self._compiled, self._keys, self._starts, self._values, "last")
+
+    def _key(self, index):
+        return self._compiled.string(self._keys[index])
+
+    def key(self, index):
+        # key at a position of the sorted index
+        return self._key(index).decode("utf-8")
+
+    def position(self, key):
+        # position of a key in the sorted index, -1 if missing
+        return self._find(key)
+
+    def stressCounts(self):
+        # numpy array aligned with the sorted keys: primary stress marks in each key's first entry
+        starts = np.frombuffer(self._starts, dtype=np.uint32)[:-1]
+        values = np.frombuffer(self._values, dtype=np.uint32)
+        return self._compiled.stress[values[starts]]
+
+    def _value(self, index):
+        begin = self._starts[index]
+        if self._only == "first":
+            return self._compiled.string(self._values[begin]).decode("utf-8")
+        if self._only == "last":
+            return self._compiled.string(self._values[self._starts[index + 1] - 1]).decode("utf-8")
+        return tuple(self._compiled.string(self._values[position]).decode("utf-8")
+                     for position in range(begin, self._starts[index + 1]))
+
+    def _find(self, key):
+        try:
+            target = key.encode("utf-8")
+        except (AttributeError, UnicodeEncodeError):
+            return -1
+        low = 0
+        high = len(self._keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._keys) and self._key(low) == target:
+            return low
+        return -1
+
+    def __getitem__(self, key):
+        index = self._find(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._value(index)
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        for index in range(len(self._keys)):
+            yield self._key(index).decode("utf-8")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def items(self):
+        return _CompiledItems(self)
+
+
+class _CompiledItems(ItemsView):
+    # walks the mapped entries in order instead of searching for each key
+
+    def __iter__(self):
+        mapping = self._mapping
+        for index in range(len(mapping)):
+            yield (mapping._key(index).decode("utf-8"), mapping._value(index))
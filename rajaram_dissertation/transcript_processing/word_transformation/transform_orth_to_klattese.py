@@ -6,23 +6,46 @@
      exceptions' that will be corrected
      - phonological forms without any stressed vowels
      - phonological forms with more than one stressed vowel
+   - the exceptions are folded into the CMU dictionary once, as the single
+     lookup table self.pronunciations (a PronunciationOverlay). Each entry
+     carries its number of primary stresses, so the words with zero or
+     several are found with an index query (with_stress) when the
+     dictionary is loaded, and kept in stress_problems instead of being
+     printed during translation
+   - translate_many translates a whole list of words at once through a
+     bounded memo, and returns the words that could not be translated
+     cleanly as TranslationProblem records
 
     LAST EXAMINED: 8-23-18
     STATUS: - used in rajaram_dissertation
             - may not be DRY, but functions fine
 
 """
-import re
-from completed_projects.rajaram_dissertation.transcript_processing.word_transformation.cmutranslator.cmutranslator import CMUTranslator
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
+import numpy as np
+from completed_projects.rajaram_dissertation.resource_registry import ResourceRegistry
+
+# word that did not translate cleanly: issue is one of the three below
+TranslationProblem = namedtuple('TranslationProblem', ['word', 'phon', 'issue'])
+NOT_IN_CMU = 'not in CMU'
+NO_STRESS = 'no primary stress'
+MULTIPLE_STRESS = 'multiple primary stress'
 
 
 class PhonologicalFromOrthographic():
-    def __init__(self,surpress_errors=True):
+    def __init__(self,surpress_errors=True,cache_size=2**16):
+        # when surpress_errors is False, translate_many prints the problem words
         self.surpress_error = surpress_errors
-        CMUdictionary = CMUTranslator("STRESS")
+        # shared with every other user of the STRESS CMU dictionary
+        CMUdictionary = ResourceRegistry().cmu
         self.translation_execptions = dict()
         self.load_translation_execptions()
         self.CMU = CMUdictionary.CMUDict
+        self.pronunciations = PronunciationOverlay(self.CMU, self.translation_execptions)
+        self.stress_problems = self.validate_stress()
+        self.translate_word = lru_cache(maxsize=cache_size)(self.lookup_word)
 
     def load_translation_execptions(self):
         # words that do not have stress marked in the CMU dictionary
@@ -568,43 +591,114 @@ class PhonologicalFromOrthographic():
         phonwords = all_phonwords & orthwords
         return phonwords
 
+    def validate_stress(self):
+        # returns word -> TranslationProblem for every translation (CMU merged with
+        # the exceptions) without exactly one primary stress
+        problems = dict()
+        for word in self.pronunciations.with_stress(0, 0):
+            problems[word] = TranslationProblem(word, self.pronunciations[word], NO_STRESS)
+        for word in self.pronunciations.with_stress(2):
+            problems[word] = TranslationProblem(word, self.pronunciations[word], MULTIPLE_STRESS)
+        return problems
+
+    def lookup_word(self, word):
+        # returns (translation, problem or None); memoized per instance as translate_word
+        phon = self.pronunciations.get(word)
+        if phon is None:
+            return ('ERROR-PHONOLOGICAL TRANSLATOR: ' + word, TranslationProblem(word, None, NOT_IN_CMU))
+        return (phon, self.stress_problems.get(word))
+
     def orth_to_phon(self,word):
         # returns the phonological_transformation translation of an orthographic form
-        def double_check(trans):
-            ones = len(re.findall("1",trans))
-            if ones > 1:
-                print("self.translation_execptions['", word, "'] ='", self.CMU[word], "'", sep="")
-            elif ones < 1:
-                print("self.translation_execptions['", word, "'] ='", self.CMU[word], "'", sep="")
-
-        if word in self.CMU:
-            #print(word)
-            ones = len(re.findall("1",self.CMU[word]))
-            if ones > 1:
-                if not word in self.translation_execptions:
-                    print("self.translation_execptions['", word, "'] ='", self.CMU[word], "'", sep="")
-            elif ones < 1:
-                if not word in self.translation_execptions:
-                    print("self.translation_execptions['", word, "'] ='", self.CMU[word], "'", sep="")
-            # returns the appropriate word
-            if word in self.translation_execptions:
-                double_check(self.translation_execptions[word])
-                return self.translation_execptions[word]
+        return self.translate_word(word)[0]
+
+    def translate_many(self, words):
+        """
+
+        :param words: iterable of orthographic forms
+        :return: (numpy array of translations in the same order,
+                  list of TranslationProblem, one per distinct problem word)
+        """
+        translations = list()
+        problems = dict()
+        for word in words:
+            (phon, problem) = self.translate_word(word)
+            translations.append(phon)
+            if problem is not None:
+                problems[word] = problem
+        problems = list(problems.values())
+        if not self.surpress_error:
+            self.print_problems(problems)
+        return np.array(translations, dtype=object), problems
+
+    def print_problems(self, problems):
+        # prints the problems in the form used by load_translation_execptions
+        for problem in problems:
+            if problem.issue == NOT_IN_CMU:
+                print(problem.word, 'not in CMU')
             else:
-                return self.CMU[word]
-        else:
-            if self.surpress_error:
-                print(word,'not in CMU')
-            return 'ERROR-PHONOLOGICAL TRANSLATOR: '+word
+                print("self.translation_execptions['", problem.word, "'] ='", problem.phon, "'", sep="")
 
     def find_multiple_stress(self):
         # finds words with multiple primary stress markings to be
         # able to put them into the translation exceptions
-        for orth,phon in self.CMU.items():
-            if len(re.findall("1",phon))> 1:
-                print(orth,phon)
+        for word in self.pronunciations.with_stress(2):
+            print(word, self.pronunciations[word])
+
+
+class PronunciationOverlay(Mapping):
+    """ The CMU dictionary with the translation exceptions folded in.
+
+        Reads like a dict of orthographic -> klattese. Each entry also
+        carries its number of primary stresses, taken from the compiled
+        CMU dictionary and corrected for the exceptions, so with_stress()
+        is a query on that array instead of a scan of the dictionary.
+    """
+
+    def __init__(self, cmu, exceptions):
+        self.cmu = cmu
+        # as before, the exceptions only correct words that are in the CMU dictionary
+        self.overrides = dict()
+        self.stress = cmu.stressCounts().copy()
+        for word, phon in exceptions.items():
+            position = cmu.position(word)
+            if position >= 0:
+                self.overrides[word] = phon
+                self.stress[position] = phon.count("1")
+
+    def __getitem__(self, word):
+        if word in self.overrides:
+            return self.overrides[word]
+        return self.cmu[word]
+
+    def __contains__(self, word):
+        return word in self.cmu
+
+    def __iter__(self):
+        return iter(self.cmu)
+
+    def __len__(self):
+        return len(self.cmu)
+
+    def stress_count(self, word):
+        # number of primary stresses in the translation of word
+        position = self.cmu.position(word)
+        if position < 0:
+            raise KeyError(word)
+        return int(self.stress[position])
+
+    def with_stress(self, low, high=None):
+        """
+
+        :param low: smallest number of primary stresses
+        :param high: largest number, or None for no upper limit
+        :return: list of words whose translation has between low and high primary stresses
+        """
+        found = self.stress >= low
+        if high is not None:
+            found &= self.stress <= high
+        return [self.cmu.key(position) for position in np.flatnonzero(found)]
 
 if __name__ == "__main__":
     T = PhonologicalFromOrthographic()
     T.find_multiple_stress()
-